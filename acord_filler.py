@@ -17,14 +17,24 @@ MIT License.
 import argparse
 import json
 import os
-import subprocess
 import sys
-import tempfile
 from datetime import date
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
 import fitz  # PyMuPDF
 
+from form_template import FormTemplate, field_text_layer, fill_fields, get_template
+from ocr_service import ocr_file
+from pdf_flatten import (
+    DEFAULT_JPEG_QUALITY,
+    ENCODINGS,
+    FLATTEN_MODES,
+    RASTER_MODES,
+    flatten_document,
+    flatten_mode,
+)
+from stage_timings import NULL_TIMINGS, StageTimings, format_timings
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
@@ -365,36 +375,17 @@ def _build_field_data(config: dict) -> dict[str, str]:
     return fields
 
 
-def _fill_widgets(doc: fitz.Document, fields: dict[str, str]) -> tuple[int, list[str]]:
+def _fill_widgets(
+    doc: fitz.Document, fields: dict[str, str], template: FormTemplate
+) -> tuple[int, list[str]]:
     """Fill PDF form widgets with field data.
 
+    Uses the template's widget index so only the supplied fields are touched.
+
     Returns:
         (filled_count, list of skipped field names not found in form)
     """
-    all_field_names = set()
-    filled = 0
-
-    for page in doc:
-        for widget in page.widgets():
-            all_field_names.add(widget.field_name)
-            if widget.field_name in fields:
-                widget.field_value = str(fields[widget.field_name])
-                widget.update()
-                filled += 1
-
-    skipped = [k for k in fields if k not in all_field_names]
-    return filled, skipped
-
-
-def _flatten_to_images(doc: fitz.Document, output_path: str, dpi: int = 200) -> None:
-    """Flatten PDF by rendering each page as an image and rebuilding."""
-    dst = fitz.open()
-    for page in doc:
-        pix = page.get_pixmap(dpi=dpi)
-        img_page = dst.new_page(width=page.rect.width, height=page.rect.height)
-        img_page.insert_image(page.rect, pixmap=pix)
-    dst.save(output_path, deflate=True)
-    dst.close()
+    return fill_fields(doc, template, fields)
 
 
 def _draw_general_info_yn(
@@ -463,28 +454,16 @@ def _draw_prior_carrier_property(
             )
 
 
-def _apply_ocr(pdf_path: str) -> bool:
-    """Apply OCR to a flattened PDF using ocrmypdf.
+def _apply_ocr(pdf_path: str) -> dict:
+    """OCR a flattened PDF in place through the shared OCR pool.
 
-    Returns True if successful, False otherwise.
+    Returns the ocr_service stats (ocr_applied, ocr_error, ocr_queue_ms,
+    ocr_ms). On failure the file is left image-only.
     """
-    try:
-        subprocess.run(
-            [
-                "ocrmypdf",
-                "--skip-text",
-                "--optimize", "1",
-                "--output-type", "pdf",
-                pdf_path,
-                pdf_path,
-            ],
-            check=True,
-            capture_output=True,
-        )
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print(f"Warning: OCR failed ({e}). Output is image-only.", file=sys.stderr)
-        return False
+    stats = ocr_file(pdf_path)
+    if not stats["ocr_applied"]:
+        print(f"Warning: OCR failed ({stats['ocr_error']}). Output is image-only.", file=sys.stderr)
+    return stats
 
 
 def _create_broker_notes_pdf(notes: list[str], output_path: str) -> None:
@@ -559,11 +538,15 @@ def fill_acord(
     form_path: str,
     input_path: str,
     output_path: str,
-    flatten: bool = True,
+    flatten: Union[bool, str] = True,
     ocr: bool = False,
     dpi: int = 200,
     broker_notes_path: Optional[str] = None,
     skip_gl: bool = False,
+    workers: int = 1,
+    encoding: str = "rgb",
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+    timings: Optional[StageTimings] = None,
 ) -> dict[str, Any]:
     """Fill an ACORD 125/140 form from a JSON config file.
 
@@ -571,85 +554,105 @@ def fill_acord(
         form_path: Path to blank fillable ACORD PDF.
         input_path: Path to JSON config file.
         output_path: Where to save the filled PDF.
-        flatten: Render to non-editable image PDF (default True).
-        ocr: Apply OCR for searchable text (default False).
-        dpi: Resolution for flattening (default 200).
+        flatten: Make the output non-editable (default True). True or
+            "raster" renders pages to images; "searchable" also writes an
+            invisible text layer of the filled values; "vector" bakes the field
+            appearances into the page content instead.
+        ocr: Apply OCR for searchable text to raster output (default False).
+        dpi: Resolution for raster flattening (default 200).
         broker_notes_path: If set, write broker notes to this separate PDF.
         skip_gl: Skip GL pages (5-8) for property-only policies.
+        workers: Rasterize page ranges in this many processes (raster mode).
+        encoding: Raster page encoding: rgb, gray, bilevel or jpeg.
+        jpeg_quality: JPEG quality when encoding is "jpeg".
+        timings: Record per-stage wall/CPU time and bytes into this
+            StageTimings and return them as result["timings"].
 
     Returns:
-        Dict with filled_count, total_fields, skipped_fields, ocr_applied.
+        Dict with filled_count, total_fields, skipped_fields, ocr_applied,
+        output_bytes (and encoding / encode_ms for raster output, and
+        ocr_error / ocr_queue_ms / ocr_ms when OCR ran).
     """
-    with open(input_path) as f:
-        config = json.load(f)
+    timer = timings if timings is not None else NULL_TIMINGS
 
-    # Build flat field mapping from structured config
-    fields = _build_field_data(config)
-
-    # Open form and fill widgets
-    doc = fitz.open(form_path)
-    filled_count, skipped = _fill_widgets(doc, fields)
-    total_fields = sum(1 for p in doc for _ in p.widgets())
-
-    if flatten:
-        # Save temp filled version, then flatten
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp_path = tmp.name
-        doc.save(tmp_path)
-        doc.close()
-
-        # Re-open and flatten to images
-        src = fitz.open(tmp_path)
+    with timer.stage("load"):
+        with open(input_path) as f:
+            config = json.load(f)
+        template = get_template(form_path)
+        doc = template.open()
 
+    # Build flat field mapping from structured config
+    with timer.stage("map"):
+        fields = _build_field_data(config)
+
+    # Fill the cloned blank's widgets
+    with timer.stage("fill"):
+        filled_count, skipped = _fill_widgets(doc, fields, template)
+    total_fields = template.widget_count
+
+    mode = flatten_mode(flatten)
+    flatten_stats: dict[str, Any] = {}
+    if mode:
+        # Flatten straight from the filled in-memory doc — no temp file.
+        # For property-only policies the GL pages are dropped here.
+        pages = None
         if skip_gl:
-            # Remove GL pages before flattening
-            pages_to_keep = [
-                i for i in range(len(src)) if i not in GL_PAGE_INDICES
-            ]
-            dst = fitz.open()
-            for i in pages_to_keep:
-                page = src[i]
-                pix = page.get_pixmap(dpi=dpi)
-                img_page = dst.new_page(width=page.rect.width, height=page.rect.height)
-                img_page.insert_image(page.rect, pixmap=pix)
-        else:
-            dst = fitz.open()
-            for page in src:
-                pix = page.get_pixmap(dpi=dpi)
-                img_page = dst.new_page(
-                    width=page.rect.width, height=page.rect.height
-                )
-                img_page.insert_image(page.rect, pixmap=pix)
-
-        src.close()
-        os.unlink(tmp_path)
+            pages = [i for i in range(len(doc)) if i not in GL_PAGE_INDICES]
+        with timer.stage("flatten"):
+            dst = flatten_document(
+                doc,
+                mode=mode,
+                dpi=dpi,
+                pages=pages,
+                workers=workers,
+                encoding=encoding,
+                quality=jpeg_quality,
+                stats=flatten_stats,
+                text_layer=field_text_layer(template, fields) if mode == "searchable" else None,
+            )
+        doc.close()
+        if mode in RASTER_MODES:
+            flatten_stats["encoding"] = encoding
 
         # Draw overlays on flattened pages
-        _draw_general_info_yn(dst, config, page_index=2)
-        _draw_prior_carrier_property(dst, config, page_index=2)
+        with timer.stage("overlay"):
+            _draw_general_info_yn(dst, config, page_index=2)
+            _draw_prior_carrier_property(dst, config, page_index=2)
 
-        dst.save(output_path, deflate=True)
+        with timer.stage("save") as stage:
+            dst.save(output_path, deflate=True)
+            stage.bytes = os.path.getsize(output_path)
         dst.close()
     else:
-        doc.save(output_path)
+        with timer.stage("save") as stage:
+            doc.save(output_path)
+            stage.bytes = os.path.getsize(output_path)
         doc.close()
 
-    # OCR
-    ocr_applied = False
-    if ocr and flatten:
-        ocr_applied = _apply_ocr(output_path)
+    # OCR — only image-only output needs it; searchable and vector output
+    # already carry the real text
+    ocr_stats = {"ocr_applied": False}
+    if ocr and mode == "raster":
+        with timer.stage("ocr"):
+            ocr_stats = _apply_ocr(output_path)
 
     # Broker notes (always a separate file)
     notes = config.get("broker_notes", [])
     if broker_notes_path and notes:
-        _create_broker_notes_pdf(notes, broker_notes_path)
+        with timer.stage("notes"):
+            _create_broker_notes_pdf(notes, broker_notes_path)
+
+    if timings is not None:
+        flatten_stats["timings"] = timings.as_dict()
 
     return {
         "filled_count": filled_count,
         "total_fields": total_fields,
         "skipped_fields": skipped,
-        "ocr_applied": ocr_applied,
+        **ocr_stats,
         "output_path": output_path,
+        "output_bytes": os.path.getsize(output_path),
+        **flatten_stats,
         "broker_notes_path": broker_notes_path if notes else None,
     }
 
@@ -678,6 +681,13 @@ def main():
         action="store_true",
         help="Keep output editable (don't flatten)",
     )
+    parser.add_argument(
+        "--flatten-mode",
+        choices=FLATTEN_MODES,
+        default="raster",
+        help="raster = render pages to images, searchable = images + invisible text layer, "
+        "vector = bake field appearances (default: raster)",
+    )
     parser.add_argument(
         "--ocr", action="store_true", help="Apply OCR for searchable text"
     )
@@ -687,6 +697,29 @@ def main():
         default=200,
         help="DPI for flattening (default: 200)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to rasterize pages with (default: 1)",
+    )
+    parser.add_argument(
+        "--encoding",
+        choices=ENCODINGS,
+        default="rgb",
+        help="Raster page encoding; bilevel is smallest for forms (default: rgb)",
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=DEFAULT_JPEG_QUALITY,
+        help=f"JPEG quality for --encoding jpeg (default: {DEFAULT_JPEG_QUALITY})",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print per-stage timings",
+    )
     parser.add_argument(
         "--broker-notes",
         help="Output path for separate broker notes PDF",
@@ -721,11 +754,15 @@ def main():
         form_path=args.form,
         input_path=args.input,
         output_path=args.output,
-        flatten=not args.no_flatten,
+        flatten=False if args.no_flatten else args.flatten_mode,
         ocr=args.ocr,
         dpi=args.dpi,
         broker_notes_path=args.broker_notes,
         skip_gl=args.skip_gl,
+        workers=args.workers,
+        encoding=args.encoding,
+        jpeg_quality=args.jpeg_quality,
+        timings=StageTimings() if args.timings else None,
     )
 
     print(f"Filled {result['filled_count']} of {result['total_fields']} fields")
@@ -735,9 +772,13 @@ def main():
             print(f"  ... and {len(result['skipped_fields']) - 10} more")
     if result["ocr_applied"]:
         print("OCR applied ✓")
-    print(f"Saved to {result['output_path']}")
+    if "encode_ms" in result:
+        print(f"Encoded as {result['encoding']} in {result['encode_ms']:.0f}ms")
+    print(f"Saved to {result['output_path']} ({result['output_bytes']:,} bytes)")
     if result["broker_notes_path"]:
         print(f"Broker notes saved to {result['broker_notes_path']}")
+    if "timings" in result:
+        print(format_timings(result["timings"]))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+AI Client — One pooled HTTP client for the extraction backend.
+
+Every extraction attempt used to open its own httpx.AsyncClient, paying a
+TCP + TLS handshake to the model API each time. This module keeps a single
+client for the life of the server: connections are kept alive and reused,
+HTTP/2 is used when the `h2` package is installed, and the number of
+concurrent upstream connections is capped (requests beyond the cap wait for
+a free connection).
+
+post_hedged() adds tail-latency control on top. If an attempt is still
+running after the recent p95 (by default) of successful response times,
+a second, hedged attempt is started. Whichever finishes first wins and the
+other is cancelled. 429/5xx responses and transport errors are retried with
+full-jitter backoff (or the server's Retry-After), all within one overall
+deadline; each attempt still gets at most ACORD_AI_TIMEOUT of it. Every attempt's latency and outcome is returned, so the server
+can store it and the thresholds can be tuned from real traffic.
+
+Settings (environment):
+    ACORD_AI_BASE_URL         model API base URL (default https://api.anthropic.com);
+                              point it at a local stub for load tests
+    ACORD_AI_TIMEOUT          read/write/pool timeout in seconds, per attempt (default 60)
+    ACORD_AI_CONNECT_TIMEOUT  connect timeout in seconds (default 10)
+    ACORD_AI_MAX_CONNECTIONS  concurrent upstream connections (default 20)
+    ACORD_AI_HTTP2            0 to stay on HTTP/1.1 (default 1)
+    ACORD_AI_DEADLINE         overall budget per call, retries included (default 90)
+    ACORD_AI_RETRIES          retries after a 429/5xx/transport error (default 2)
+    ACORD_AI_HEDGE            0 to never hedge (default 1)
+    ACORD_AI_HEDGE_PERCENTILE latency percentile that triggers a hedge (default 95)
+    ACORD_AI_HEDGE_AFTER      hedge delay until 20 latencies are recorded (default 20)
+    ACORD_AI_HEDGE_MIN_DELAY  never hedge sooner than this (default 2)
+
+Usage:
+    from ai_client import get_ai_client
+    resp = await get_ai_client().post("/v1/messages", headers={"x-api-key": key}, json=body)
+    resp, attempts = await post_hedged("/v1/messages", headers={"x-api-key": key}, json=body)
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+
+AI_BASE_URL = os.getenv("ACORD_AI_BASE_URL", "https://api.anthropic.com")
+AI_TIMEOUT = float(os.getenv("ACORD_AI_TIMEOUT", "60"))
+AI_CONNECT_TIMEOUT = float(os.getenv("ACORD_AI_CONNECT_TIMEOUT", "10"))
+AI_MAX_CONNECTIONS = int(os.getenv("ACORD_AI_MAX_CONNECTIONS", "20"))
+AI_HTTP2 = os.getenv("ACORD_AI_HTTP2", "1") != "0"
+AI_DEADLINE = float(os.getenv("ACORD_AI_DEADLINE", "90"))
+AI_RETRIES = int(os.getenv("ACORD_AI_RETRIES", "2"))
+AI_HEDGE = os.getenv("ACORD_AI_HEDGE", "1") != "0"
+AI_HEDGE_PERCENTILE = float(os.getenv("ACORD_AI_HEDGE_PERCENTILE", "95"))
+AI_HEDGE_AFTER = float(os.getenv("ACORD_AI_HEDGE_AFTER", "20"))
+AI_HEDGE_MIN_DELAY = float(os.getenv("ACORD_AI_HEDGE_MIN_DELAY", "2"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+HEDGE_MIN_SAMPLES = 20
+
+ANTHROPIC_VERSION = "2023-06-01"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_ai_client() -> httpx.AsyncClient:
+    """The shared client, created on first use. Paths are relative to AI_BASE_URL."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=AI_BASE_URL,
+            http2=AI_HTTP2 and _http2_available(),
+            timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=AI_MAX_CONNECTIONS,
+                                max_keepalive_connections=AI_MAX_CONNECTIONS,
+                                keepalive_expiry=30),
+            headers={"anthropic-version": ANTHROPIC_VERSION, "content-type": "application/json"},
+        )
+    return _client
+
+
+def client_info() -> dict:
+    """Client settings, for the dashboard."""
+    return {
+        "base_url": AI_BASE_URL,
+        "http2": AI_HTTP2 and _http2_available(),
+        "max_connections": AI_MAX_CONNECTIONS,
+        "open": _client is not None and not _client.is_closed,
+    }
+
+
+async def aclose() -> None:
+    """Close pooled connections; call on server shutdown."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+# ── Hedging and retries ──
+
+class LatencyWindow:
+    """The last `size` successful response times, for percentiles."""
+
+    def __init__(self, size: int = 500):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, ms: float) -> None:
+        self._samples.append(ms)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+latencies = LatencyWindow()
+_counters = {"calls": 0, "attempts": 0, "hedges": 0, "hedge_wins": 0, "retries": 0}
+
+
+def hedge_delay() -> float:
+    """Seconds to wait on an attempt before hedging it."""
+    if len(latencies) < HEDGE_MIN_SAMPLES:
+        return AI_HEDGE_AFTER
+    return max(AI_HEDGE_MIN_DELAY, latencies.percentile(AI_HEDGE_PERCENTILE) / 1000)
+
+
+def _retry_after(resp: Optional[httpx.Response]) -> Optional[float]:
+    try:
+        return float(resp.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+async def post_hedged(path: str, *, headers: dict, json: dict,
+                      deadline: float = AI_DEADLINE) -> tuple[Optional[httpx.Response], list[dict]]:
+    """POST with hedging and jittered retries, within `deadline` seconds.
+
+    Returns:
+        (response, attempts). response is the first non-retryable response,
+        else the last retryable one, or None if no attempt got a response
+        (the errors are in attempts). attempts has one dict per attempt:
+        attempt, round, hedge, status, latency_ms, outcome
+        ("ok"/"retryable"/"error"/"cancelled"), error.
+    """
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    attempts: list[dict] = []
+    client = get_ai_client()
+    _counters["calls"] += 1
+
+    async def attempt(round_no: int, hedge: bool) -> httpx.Response:
+        entry = {"attempt": len(attempts) + 1, "round": round_no, "hedge": hedge,
+                 "status": None, "latency_ms": None, "outcome": "error", "error": None}
+        attempts.append(entry)
+        _counters["attempts"] += 1
+        start = time.perf_counter()
+        try:
+            # No single attempt outlives AI_TIMEOUT, leaving the rest of the
+            # deadline for a retry
+            remaining = max(0.1, end - loop.time())
+            resp = await client.post(path, headers=headers, json=json,
+                                     timeout=httpx.Timeout(min(AI_TIMEOUT, remaining),
+                                                           connect=min(AI_CONNECT_TIMEOUT, remaining)))
+        except asyncio.CancelledError:
+            entry["outcome"] = "cancelled"
+            raise
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        entry["status"] = resp.status_code
+        if resp.status_code in RETRYABLE_STATUS:
+            entry["outcome"] = "retryable"
+        else:
+            entry["outcome"] = "ok"
+            if resp.status_code == 200:
+                latencies.add(entry["latency_ms"])
+        return resp
+
+    resp: Optional[httpx.Response] = None
+    for round_no in range(AI_RETRIES + 1):
+        tasks = {asyncio.ensure_future(attempt(round_no, False))}
+        hedge_task = None
+        try:
+            delay = hedge_delay()
+            if AI_HEDGE and loop.time() + delay < end:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    _counters["hedges"] += 1
+                    hedge_task = asyncio.ensure_future(attempt(round_no, True))
+                    tasks.add(hedge_task)
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, end - loop.time()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break  # out of time
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception:
+                        continue  # recorded in attempts
+                    resp = result
+                    if result.status_code not in RETRYABLE_STATUS:
+                        if task is hedge_task:
+                            _counters["hedge_wins"] += 1
+                        return result, attempts
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if round_no == AI_RETRIES:
+            break
+        wait = _retry_after(resp) if resp is not None else None
+        if wait is None:
+            wait = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** round_no))
+        if loop.time() + wait >= end:
+            break
+        _counters["retries"] += 1
+        await asyncio.sleep(wait)
+
+    return resp, attempts
+
+
+def latency_stats() -> dict:
+    """Attempt latencies and hedge/retry counters, for the dashboard."""
+    return {
+        **_counters,
+        "samples": len(latencies),
+        "p50_ms": latencies.percentile(50),
+        "p95_ms": latencies.percentile(95),
+        "p99_ms": latencies.percentile(99),
+        "hedge_after_ms": round(hedge_delay() * 1000, 1) if AI_HEDGE else None,
+    }
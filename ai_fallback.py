@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+AI Fallback — Non-blocking credential and CLI fallbacks for extraction.
+
+When the configured ANTHROPIC_API_KEY fails, extraction falls back to a
+token resolved from the openclaw auth system, and then to running the
+openclaw CLI itself. Both used to be blocking subprocess.run calls on the
+event loop (15 s and 90 s timeouts). Here they are asyncio subprocesses,
+and:
+
+  - the resolved token is cached for ACORD_AI_CRED_TTL seconds behind a
+    lock, so N requests failing together resolve it once; it is only
+    dropped early when the API rejects it (401/403);
+  - each fallback sits behind a circuit breaker: after
+    ACORD_AI_BREAKER_FAILURES consecutive failures it is skipped for
+    ACORD_AI_BREAKER_RESET seconds, then one trial call is let through.
+    For the credential fallback a success is an upstream 200 with the
+    key, not merely resolving one; 5xx, timeouts and transport errors
+    count as failures without evicting the key.
+
+Usage:
+    from ai_fallback import report_fallback_key, resolve_fallback_key, run_cli_fallback
+    key = await resolve_fallback_key()      # "" if nothing resolved or tripped
+    report_fallback_key(key, status)        # upstream status, None on transport error
+    text = await run_cli_fallback(prompt)   # None if the CLI failed or is tripped
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+CRED_TTL = float(os.getenv("ACORD_AI_CRED_TTL", "300"))
+BREAKER_FAILURES = int(os.getenv("ACORD_AI_BREAKER_FAILURES", "3"))
+BREAKER_RESET = float(os.getenv("ACORD_AI_BREAKER_RESET", "60"))
+
+RESOLVE_TIMEOUT = 15
+CLI_TIMEOUT = 90
+
+AUTH_PROFILES_PATH = "/root/.openclaw/agents/main/agent/auth-profiles.json"
+
+_RESOLVE_SCRIPT = """source /root/.nvm/nvm.sh && nvm use 22 >/dev/null 2>&1 && node -e "
+const { resolveProviderAuth } = require('openclaw/dist/auth/resolve.js');
+resolveProviderAuth('anthropic').then(r => console.log(r.token || r.apiKey || '')).catch(() => process.exit(1));
+" 2>/dev/null"""
+
+_CLI_SCRIPT = 'source /root/.nvm/nvm.sh && nvm use 22 >/dev/null 2>&1 && openclaw agent --agent main --local -m "$1"'
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → half-open → closed.
+
+    Single event loop only (no thread locking).
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.name = name
+        self.failures = max(1, failures)
+        self.reset_after = reset_after
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.skipped = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self._opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        """Whether to attempt a call now. In half-open, only one trial at a time."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, ok: bool) -> None:
+        self._trial = False
+        if ok:
+            self._consecutive = 0
+            self._opened_at = None
+            return
+        self._consecutive += 1
+        if self._opened_at is not None or self._consecutive >= self.failures:
+            # A failed half-open trial re-opens for another full period
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._consecutive, "skipped": self.skipped}
+
+
+credential_breaker = CircuitBreaker("credential_fallback")
+cli_breaker = CircuitBreaker("cli_fallback")
+
+
+async def _run(args: list[str], timeout: float) -> tuple[int, str]:
+    """Run a command without blocking the loop. Returns (returncode, stdout); -1 on timeout."""
+    proc = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1, ""
+    return proc.returncode, stdout.decode(errors="replace").strip()
+
+
+def _read_profile_token() -> str:
+    try:
+        with open(AUTH_PROFILES_PATH) as f:
+            profiles = json.load(f)
+        return profiles.get("profiles", {}).get("anthropic:default", {}).get("token", "")
+    except Exception:
+        return ""
+
+
+_cached_key = ""
+_cached_at = 0.0
+_key_lock: Optional[asyncio.Lock] = None
+
+
+async def resolve_fallback_key() -> str:
+    """A fallback API token from openclaw, cached for CRED_TTL seconds.
+
+    Concurrent callers share one resolution. Returns "" when nothing
+    resolves or the breaker is open. A non-empty key must be followed by
+    report_fallback_key() with the outcome of the call that used it.
+    """
+    global _cached_key, _cached_at, _key_lock
+    if _key_lock is None:
+        _key_lock = asyncio.Lock()
+    async with _key_lock:
+        if not credential_breaker.allow():
+            return ""
+        if _cached_key and time.monotonic() - _cached_at < CRED_TTL:
+            return _cached_key
+        try:
+            code, key = await _run(["bash", "-c", _RESOLVE_SCRIPT], RESOLVE_TIMEOUT)
+        except Exception:
+            code, key = 1, ""
+        if code != 0 or not key:
+            # Last resort: read from auth-profiles and try anyway
+            key = await asyncio.to_thread(_read_profile_token)
+        if not key:
+            credential_breaker.record(False)
+        _cached_key, _cached_at = key, time.monotonic()
+        return key
+
+
+def report_fallback_key(key: str, status: Optional[int]) -> None:
+    """Record how the upstream API answered a call made with `key`.
+
+    Only a 200 counts as a breaker success. A 401/403 drops the cached key
+    so the next call resolves a fresh one; any other status, or None for a
+    timeout/transport error, is a failure that keeps the key.
+    """
+    global _cached_key
+    if status in (401, 403) and key == _cached_key:
+        _cached_key = ""
+    credential_breaker.record(status == 200)
+
+
+async def run_cli_fallback(prompt: str) -> Optional[str]:
+    """Ask the openclaw CLI directly. Returns its output, or None."""
+    if not cli_breaker.allow():
+        return None
+    try:
+        code, out = await _run(["bash", "-c", _CLI_SCRIPT, "_", prompt], CLI_TIMEOUT)
+    except Exception:
+        code, out = 1, ""
+    ok = code == 0 and bool(out)
+    cli_breaker.record(ok)
+    return out if ok else None
+
+
+def fallback_stats() -> dict:
+    """Breaker states and credential cache age, for the dashboard."""
+    return {
+        "credential_cached": bool(_cached_key) and time.monotonic() - _cached_at < CRED_TTL,
+        "credential_breaker": credential_breaker.stats(),
+        "cli_breaker": cli_breaker.stats(),
+    }
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Artifact Store — Content-addressed storage for the server's files.
+
+Uploads, generated certificates, extraction results and error reports used
+to be written one file per event into flat data/ directories, so an
+identical upload was stored again each time and listing a folder meant
+listing and sorting the whole directory. Here every blob is stored once
+under its full SHA-256, sharded by hash prefix:
+
+    data/artifacts/blobs/ab/cd/abcd…ef        (PDFs, stored as-is)
+    data/artifacts/blobs/ab/cd/abcd…ef.zst    (JSON, when zstandard is installed)
+
+and an `artifacts` table maps each event's (folder, name) to its blob.
+Many names can point at one blob. Listing a folder is an indexed, keyset-
+paged query. Index rows are written through the telemetry writer, so they
+show up in listings a few milliseconds after put() returns; the returned
+path is usable at once.
+
+Files still in the old flat directories are moved into the store at
+startup (import_flat_dirs), and DB rows pointing at them are updated.
+
+Settings (environment):
+    ACORD_ARTIFACT_ZSTD        0 to store JSON uncompressed (default 1; needs zstandard)
+    ACORD_ARTIFACT_ZSTD_LEVEL  zstd compression level (default 3)
+
+Usage:
+    from artifact_store import ArtifactStore, init_artifacts
+    init_artifacts(conn)                      # at startup, creates the index table
+    store = ArtifactStore(root, writer, readers)
+    art = store.put("generated", name, pdf_bytes, "application/pdf")
+    art.path, art.sha256                      # blob on disk, content hash
+    rows, next_before = store.list("generated", limit=100)
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+ARTIFACT_ZSTD = os.getenv("ACORD_ARTIFACT_ZSTD", "1") != "0"
+ARTIFACT_ZSTD_LEVEL = int(os.getenv("ACORD_ARTIFACT_ZSTD_LEVEL", "3"))
+
+FOLDERS = {
+    "uploads": "application/pdf",
+    "generated": "application/pdf",
+    "extractions": "application/json",
+    "errors": "application/json",
+}
+
+ARTIFACTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS artifacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        folder TEXT NOT NULL,
+        name TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        encoding TEXT,
+        content_type TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_artifacts_name ON artifacts(folder, name);
+    CREATE INDEX IF NOT EXISTS idx_artifacts_sha ON artifacts(sha256);
+"""
+
+_INSERT = """
+    INSERT INTO artifacts (folder, name, sha256, size, stored_size, encoding, content_type, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (folder, name) DO UPDATE SET
+        sha256 = excluded.sha256, size = excluded.size, stored_size = excluded.stored_size,
+        encoding = excluded.encoding, content_type = excluded.content_type
+"""
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def init_artifacts(conn: sqlite3.Connection) -> None:
+    """Create the artifacts index table."""
+    conn.executescript(ARTIFACTS_TABLE)
+    conn.commit()
+
+
+@dataclass
+class Artifact:
+    """One stored artifact: where its blob is and what it holds."""
+    folder: str
+    name: str
+    sha256: str
+    size: int
+    stored_size: int
+    encoding: Optional[str]
+    content_type: str
+    path: str
+    created_at: str
+    deduped: bool = False
+
+
+class ArtifactStore:
+    """SHA-256-addressed blobs under `root`, indexed in the `artifacts` table.
+
+    Blocking (file I/O); call from a thread in async code. Safe to call
+    from several threads at once: blobs are written to a temp file and
+    renamed into place, so racing writers of the same content are harmless.
+    """
+
+    def __init__(self, root: str, writer, readers, compress: bool = ARTIFACT_ZSTD):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._writer = writer
+        self._readers = readers
+        self._zstd = _zstd() if compress else None
+        self._lock = threading.Lock()
+        self._counters = {"puts": 0, "deduped": 0, "bytes_in": 0, "bytes_written": 0}
+
+    # ── Blobs ──
+
+    def blob_path(self, sha256: str, encoding: Optional[str] = None) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256[2:4],
+                            sha256 + (".zst" if encoding == "zstd" else ""))
+
+    def blob_sha256(self, path: str) -> Optional[str]:
+        """The content hash a blob path is named by, or None for a path outside the store."""
+        if os.path.dirname(os.path.dirname(os.path.dirname(path))) != self.blob_dir:
+            return None
+        name = os.path.basename(path).removesuffix(".zst")
+        return name if len(name) == 64 else None
+
+    def _existing(self, sha256: str) -> Optional[tuple[str, Optional[str]]]:
+        for encoding in ("zstd", None):
+            path = self.blob_path(sha256, encoding)
+            if os.path.exists(path):
+                return path, encoding
+        return None
+
+    def _install(self, sha256: str, encoding: Optional[str], write) -> str:
+        """Write a new blob via a temp file; `write(f)` fills it."""
+        path = self.blob_path(sha256, encoding)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.tmp_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return path
+
+    def _store_bytes(self, data: bytes, content_type: str) -> tuple[str, str, Optional[str], int, bool]:
+        """Write data's blob unless it exists. Returns (sha256, path, encoding, stored_size, deduped)."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        existing = self._existing(sha256)
+        if existing:
+            path, encoding = existing
+            return sha256, path, encoding, os.path.getsize(path), True
+        # PDFs are already deflated; only JSON is worth compressing
+        encoding = "zstd" if self._zstd and content_type == "application/json" else None
+        stored = (self._zstd.ZstdCompressor(level=ARTIFACT_ZSTD_LEVEL).compress(data)
+                  if encoding else data)
+        if len(stored) >= len(data):
+            encoding, stored = None, data  # tiny documents can grow
+        path = self._install(sha256, encoding, lambda f: f.write(stored))
+        return sha256, path, encoding, len(stored), False
+
+    def read(self, art: Artifact) -> bytes:
+        """The artifact's content, decompressed."""
+        with open(art.path, "rb") as f:
+            data = f.read()
+        if art.encoding == "zstd":
+            zstd = self._zstd or _zstd()
+            if zstd is None:
+                raise RuntimeError("zstandard is needed to read compressed artifacts")
+            data = zstd.ZstdDecompressor().decompress(data)
+        return data
+
+    # ── Writing ──
+
+    def put(self, folder: str, name: str, data: bytes, content_type: str = None,
+            created_at: str = None) -> Artifact:
+        """Store bytes under folder/name, reusing the blob if the content exists."""
+        content_type = content_type or FOLDERS[folder]
+        sha256, path, encoding, stored_size, deduped = self._store_bytes(data, content_type)
+        return self._index(folder, name, sha256, len(data), stored_size, encoding,
+                           content_type, path, created_at, deduped)
+
+    def put_file(self, folder: str, name: str, src_path: str, sha256: str,
+                 content_type: str = None, created_at: str = None) -> Artifact:
+        """Move an already-hashed file (e.g. a spooled upload) into the store.
+
+        src_path must be on the same filesystem (use tmp_dir); it is
+        consumed either way.
+        """
+        content_type = content_type or FOLDERS[folder]
+        size = os.path.getsize(src_path)
+        existing = self._existing(sha256)
+        if existing:
+            path, encoding = existing
+            os.unlink(src_path)
+        else:
+            encoding, path = None, self.blob_path(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(src_path, path)
+        return self._index(folder, name, sha256, size, os.path.getsize(path), encoding,
+                           content_type, path, created_at, deduped=bool(existing))
+
+    def _index(self, folder, name, sha256, size, stored_size, encoding, content_type, path,
+               created_at, deduped) -> Artifact:
+        created_at = created_at or datetime.now(timezone.utc).isoformat()
+        self._writer.write(_INSERT, (folder, name, sha256, size, stored_size, encoding,
+                                     content_type, created_at))
+        with self._lock:
+            self._counters["puts"] += 1
+            self._counters["bytes_in"] += size
+            if deduped:
+                self._counters["deduped"] += 1
+            else:
+                self._counters["bytes_written"] += stored_size
+        return Artifact(folder, name, sha256, size, stored_size, encoding, content_type, path,
+                        created_at, deduped)
+
+    # ── Reading the index ──
+
+    def _artifact(self, row) -> Artifact:
+        return Artifact(row["folder"], row["name"], row["sha256"], row["size"], row["stored_size"],
+                        row["encoding"], row["content_type"],
+                        self.blob_path(row["sha256"], row["encoding"]), row["created_at"])
+
+    def get(self, folder: str, name: str) -> Optional[Artifact]:
+        with self._readers.connection() as db:
+            row = db.execute("SELECT * FROM artifacts WHERE folder = ? AND name = ?",
+                             (folder, name)).fetchone()
+        return self._artifact(row) if row else None
+
+    def list(self, folder: str, limit: int = 100,
+             before: Optional[int] = None) -> tuple[list[dict], Optional[int]]:
+        """Newest-first page of a folder.
+
+        Returns:
+            (rows, next_before) — pass next_before back as `before` for the
+            next page; None when this is the last one.
+        """
+        with self._readers.connection() as db:
+            rows = db.execute(
+                "SELECT id, name, sha256, size, stored_size, created_at FROM artifacts "
+                "WHERE folder = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (folder, before if before is not None else 2 ** 63 - 1, limit + 1)).fetchall()
+        page = [dict(r) for r in rows[:limit]]
+        return page, (page[-1]["id"] if len(rows) > limit else None)
+
+    def stats(self) -> dict:
+        """Put/dedupe counters since startup, for the dashboard."""
+        with self._lock:
+            return {**self._counters, "compression": "zstd" if self._zstd else None}
+
+
+def import_flat_dirs(conn: sqlite3.Connection, store: ArtifactStore, data_dir: str,
+                     path_columns: dict[str, tuple[str, str]]) -> int:
+    """Move files from the old data/<folder>/ directories into the store.
+
+    path_columns maps a folder to the (table, column) that records file
+    paths (e.g. generations.output_path), which are rewritten to the blob
+    path. Originals are removed once their index rows are committed, so an
+    interrupted import just resumes on the next start. Returns the number
+    of files imported.
+    """
+    moved = []  # (folder, old path, blob path)
+    for folder, content_type in FOLDERS.items():
+        folder_dir = os.path.join(data_dir, folder)
+        if not os.path.isdir(folder_dir):
+            continue
+        for entry in os.scandir(folder_dir):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith(".upload-"):
+                os.unlink(entry.path)  # a spool left by a crashed upload
+                continue
+            with open(entry.path, "rb") as f:
+                data = f.read()
+            sha256, path, encoding, stored_size, _ = store._store_bytes(data, content_type)
+            created_at = datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc).isoformat()
+            conn.execute(_INSERT, (folder, entry.name, sha256, len(data), stored_size,
+                                   encoding, content_type, created_at))
+            moved.append((folder, entry.path, path))
+    if not moved:
+        return 0
+
+    # One pass per table rather than a scan per file (the path columns aren't indexed)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS moved_files (folder TEXT, old TEXT PRIMARY KEY, new TEXT)")
+    conn.executemany("INSERT OR REPLACE INTO moved_files VALUES (?, ?, ?)", moved)
+    for folder, (table, column) in path_columns.items():
+        conn.execute(f"""
+            UPDATE {table} SET {column} = (SELECT new FROM moved_files WHERE old = {table}.{column})
+            WHERE {column} IN (SELECT old FROM moved_files WHERE folder = ?)
+        """, (folder,))
+    conn.execute("DROP TABLE moved_files")
+    conn.commit()
+    for _, old, _ in moved:
+        os.unlink(old)
+    return len(moved)
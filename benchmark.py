@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+ACORD Filler Benchmarks — Measure what each pipeline stage costs.
+
+Usage:
+    python benchmark.py flatten [--dpi 200] [--repeat 3]
+    python benchmark.py workers [--max-workers 8]
+    python benchmark.py encodings [--dpi 200] [--jpeg-quality 75]
+    python benchmark.py suite [--dpi 150 200 300] [--ocr] [--output baseline.json]
+    python benchmark.py compare baseline.json [--threshold 0.2]
+    python benchmark.py parity [--dpi 100]
+
+`flatten` fills every widget of every shipped blank with sample values and
+compares raster vs vector flattening: wall time, CPU time and output size.
+`workers` shows how raster flattening of the 11-page 125/126/140 packet
+scales with the process pool.
+`encodings` raster-flattens every shipped blank with each page image
+encoding (rgb, gray, bilevel, jpeg) and reports encode time and size.
+`suite` runs every filler against its shipped example_*.json and blank at
+several DPIs, each case in a fresh process, and records the per-stage
+timings the fillers report (map, fill, flatten, save, OCR, ...), the
+end-to-end call, peak RSS and output bytes. `compare` re-runs the suite and exits non-zero if anything regressed
+past the threshold relative to a saved baseline.
+`parity` fills every widget of every shipped blank both through
+field_writer's direct xref path and through widget.update(), checks that
+values, appearance streams and rendered pages match, and times both paths;
+it exits non-zero on any mismatch.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import fitz  # PyMuPDF
+
+from field_writer import AppearanceWriter
+from form_template import fill_fields, get_template
+from pdf_flatten import DEFAULT_JPEG_QUALITY, ENCODINGS, FLATTEN_MODES, flatten_document, rasterize
+from stage_timings import StageTimings
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def shipped_blanks() -> list[str]:
+    return sorted(glob.glob(os.path.join(BASE_DIR, "*-blank.pdf")))
+
+
+def sample_field_data(blank_path: str) -> dict[str, str]:
+    """A value for every field in the blank, so every widget has an appearance.
+
+    Zero-size widgets (hidden edition stamps on 125/140) are left alone —
+    PyMuPDF refuses to build an appearance for them.
+    """
+    template = get_template(blank_path)
+    return {
+        name: "Yes" if entries[0]["type"] == "CheckBox" else "SAMPLE 1234"
+        for name, entries in template.widgets.items()
+        if not any(fitz.Rect(e["rect"]).is_empty for e in entries)
+    }
+
+
+def bench_flatten(blank_path: str, mode: str, dpi: int = 200, repeat: int = 3) -> dict:
+    """Time one flatten mode on a fully-filled blank (best of `repeat`)."""
+    template = get_template(blank_path)
+    field_data = sample_field_data(blank_path)
+    best_wall = best_cpu = float("inf")
+    size = 0
+
+    for _ in range(repeat):
+        doc = template.open()
+        fill_fields(doc, template, field_data)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        dst = flatten_document(doc, mode=mode, dpi=dpi)
+        out = dst.tobytes(deflate=True)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+        dst.close()
+        doc.close()
+        best_wall, best_cpu = min(best_wall, wall), min(best_cpu, cpu)
+        size = len(out)
+
+    return {
+        "blank": os.path.basename(blank_path),
+        "mode": mode,
+        "pages": template.page_count,
+        "fields": len(template.widgets),
+        "wall_ms": round(best_wall * 1000, 1),
+        "cpu_ms": round(best_cpu * 1000, 1),
+        "output_bytes": size,
+    }
+
+
+def run_flatten(dpi: int, repeat: int) -> list[dict]:
+    rows = []
+    print(f"{'blank':32s} {'mode':7s} {'pages':>5s} {'wall ms':>9s} {'cpu ms':>9s} {'bytes':>10s}")
+    for blank in shipped_blanks():
+        for mode in FLATTEN_MODES:
+            r = bench_flatten(blank, mode, dpi=dpi, repeat=repeat)
+            rows.append(r)
+            print(f"{r['blank']:32s} {r['mode']:7s} {r['pages']:5d} {r['wall_ms']:9.1f} "
+                  f"{r['cpu_ms']:9.1f} {r['output_bytes']:10,d}")
+
+    # Summary: how much vector saves relative to raster, per blank
+    print()
+    by_key = {(r["blank"], r["mode"]): r for r in rows}
+    for blank in shipped_blanks():
+        name = os.path.basename(blank)
+        raster, vector = by_key[(name, "raster")], by_key[(name, "vector")]
+        cpu_x = raster["cpu_ms"] / max(vector["cpu_ms"], 0.1)
+        size_x = raster["output_bytes"] / max(vector["output_bytes"], 1)
+        print(f"  {name:32s} vector is {cpu_x:6.1f}x less CPU, {size_x:5.1f}x smaller")
+    return rows
+
+
+def run_workers(max_workers: int, dpi: int, repeat: int) -> list[dict]:
+    """Raster-flatten the full 125/126/140 packet with 1..max_workers processes."""
+    blank = os.path.join(BASE_DIR, "acord-125-126-140-blank.pdf")
+    template = get_template(blank)
+    doc = template.open()
+    fill_fields(doc, template, sample_field_data(blank))
+
+    rows = []
+    print(f"{'workers':>7s} {'wall ms':>9s} {'speedup':>8s}")
+    for workers in range(1, max_workers + 1):
+        rasterize(doc, dpi=dpi, workers=workers).close()  # warm the pool
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rasterize(doc, dpi=dpi, workers=workers).close()
+            best = min(best, time.perf_counter() - start)
+        rows.append({"workers": workers, "wall_ms": round(best * 1000, 1)})
+        print(f"{workers:7d} {best * 1000:9.1f} {rows[0]['wall_ms'] / rows[-1]['wall_ms']:7.2f}x")
+    doc.close()
+    return rows
+
+
+def run_encodings(dpi: int, quality: int, repeat: int) -> list[dict]:
+    """Raster-flatten every blank with each encoding; best encode time of `repeat`."""
+    rows = []
+    print(f"{'blank':32s} {'encoding':8s} {'encode ms':>10s} {'bytes':>10s} {'vs rgb':>7s}")
+    for blank in shipped_blanks():
+        template = get_template(blank)
+        doc = template.open()
+        fill_fields(doc, template, sample_field_data(blank))
+        rgb_size = None
+        for encoding in ENCODINGS:
+            best, size = float("inf"), 0
+            for _ in range(repeat):
+                stats = {}
+                dst = rasterize(doc, dpi=dpi, encoding=encoding, quality=quality, stats=stats)
+                size = len(dst.tobytes(deflate=True))
+                dst.close()
+                best = min(best, stats["encode_ms"])
+            rgb_size = rgb_size or size  # rgb is measured first
+            rows.append({"blank": os.path.basename(blank), "encoding": encoding,
+                         "encode_ms": best, "output_bytes": size})
+            print(f"{rows[-1]['blank']:32s} {encoding:8s} {best:10.1f} {size:10,d} "
+                  f"{size / rgb_size:6.0%}")
+        doc.close()
+    return rows
+
+
+# --- Suite ---
+
+# Table columns; every stage a filler reports is kept in the JSON
+STAGES = ("map", "fill", "flatten", "save", "ocr")
+
+# Each case: (name, example json, blank, runner). Runners live in _call_public.
+SUITE_CASES = [
+    ("map_acord25+fill_acord_form", "example_multicarrier.json", "acord-25-blank.pdf", "map25"),
+    ("fill_acord_form:27", "example_acord27.json", "acord-27-blank.pdf", "fill_form"),
+    ("fill_acord_form:28", "example_acord28.json", "acord-28-blank.pdf", "fill_form"),
+    ("acord_filler.fill_acord", "example_input.json", "acord-125-126-140-blank.pdf", "acord_filler"),
+    ("fill_acord24", "example_acord24.json", "acord-24-blank.pdf", "filler24"),
+    ("fill_acord25", "example_acord25.json", "acord-25-blank.pdf", "filler25"),
+    ("fill_acord37", "example_acord37.json", "acord-37-blank.pdf", "filler37"),
+]
+
+# Regressions smaller than this are noise, whatever the ratio
+MIN_REGRESSION_MS = 5.0
+
+
+def _call_public(runner: str, data: dict, example: str, blank: str, out: str, dpi: int,
+                 ocr: bool, timings: StageTimings) -> dict:
+    """One end-to-end call of the public function the case stands for."""
+    if runner in ("map25", "fill_form"):
+        from fill_acord import fill_acord_form
+        fields = data
+        if runner == "map25":
+            from map_acord25 import map_to_acord25
+            with timings.stage("map"):
+                fields = map_to_acord25(data, data.get("cert_holder", {}), data.get("agency", {}))
+        return fill_acord_form(blank, fields, out, flatten=True, dpi=dpi, timings=timings)
+    # With --ocr the fillers run raster + OCR instead of their searchable default
+    flatten = "raster" if ocr else "searchable"
+    if runner == "acord_filler":
+        from acord_filler import fill_acord
+        return fill_acord(blank, example, out, ocr=ocr, dpi=dpi, timings=timings)
+    if runner == "filler24":
+        from fill_acord24 import fill_acord24
+        return fill_acord24(data, blank, out, ocr=ocr, flatten=flatten, dpi=dpi,
+                            timings=timings)
+    if runner == "filler25":
+        from fill_acord25 import fill_acord25
+        return fill_acord25(data, blank, out, ocr=ocr, flatten=flatten, dpi=dpi,
+                            timings=timings)
+    if runner == "filler37":
+        from fill_acord37 import fill_acord37
+        return fill_acord37(data, blank, out, ocr=ocr, flatten=flatten, dpi=dpi,
+                            timings=timings)
+    raise ValueError(f"Unknown runner: {runner}")
+
+
+def _run_case(name: str, example: str, blank: str, runner: str, dpi: int,
+              repeat: int, ocr: bool) -> dict:
+    """Suite worker — runs in its own process so ru_maxrss is this case's peak.
+
+    Stage timings are the ones the fillers record themselves (see
+    stage_timings); each stage keeps its best wall time over `repeat` runs.
+    """
+    example = os.path.join(BASE_DIR, example)
+    with open(example) as f:
+        data = json.load(f)
+    blank = os.path.join(BASE_DIR, blank)
+    stages, best_total = {}, None
+    tmpdir = tempfile.mkdtemp(prefix="acord-bench-")
+    out = os.path.join(tmpdir, "out.pdf")
+
+    try:
+        for _ in range(repeat):
+            timings = StageTimings()
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = _call_public(runner, data, example, blank, out, dpi, ocr, timings)
+            wall, cpu = (time.perf_counter() - wall) * 1000, (time.process_time() - cpu) * 1000
+            if best_total is None or wall < best_total["wall_ms"]:
+                best_total = {"wall_ms": round(wall, 1), "cpu_ms": round(cpu, 1)}
+            for stage, entry in result["timings"].items():
+                if stage not in stages or entry["wall_ms"] < stages[stage]["wall_ms"]:
+                    stages[stage] = entry
+        output_bytes = os.path.getsize(out)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # bytes there, KiB on Linux
+        peak //= 1024
+    return {
+        "case": name,
+        "dpi": dpi,
+        "stages": stages,
+        "total": best_total,
+        "peak_rss_kb": peak,
+        "output_bytes": output_bytes,
+    }
+
+
+def run_suite(dpis: list[int], repeat: int, ocr: bool, output: str = None,
+              cases: set = None) -> dict:
+    """Run every case (or just `cases`) at every DPI; optionally write a baseline."""
+    results = []
+    print(f"{'case':30s} {'dpi':>4s} " + " ".join(f"{s:>8s}" for s in STAGES)
+          + f" {'total':>8s} {'rss MB':>7s} {'bytes':>10s}")
+    for name, example, blank, runner in SUITE_CASES:
+        if cases is not None and name not in cases:
+            continue
+        if not os.path.exists(os.path.join(BASE_DIR, blank)):
+            print(f"{name:30s} skipped — {blank} is not shipped")
+            continue
+        for dpi in dpis:
+            # A one-off single-worker pool per case: a fresh process keeps peak RSS honest
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                r = pool.submit(_run_case, name, example, blank, runner, dpi, repeat, ocr).result()
+            results.append(r)
+            cells = " ".join(f"{r['stages'][s]['wall_ms']:8.1f}" if s in r["stages"] else f"{'-':>8s}"
+                             for s in STAGES)
+            print(f"{name:30s} {dpi:4d} {cells} {r['total']['wall_ms']:8.1f} "
+                  f"{r['peak_rss_kb'] / 1024:7.1f} {r['output_bytes']:10,d}")
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "ocr": ocr,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {output}")
+    return report
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Everything in `current` that is worse than `baseline` by more than threshold."""
+    regressions = []
+    base = {(r["case"], r["dpi"]): r for r in baseline["results"]}
+
+    def check(label, old, new, floor=0.0):
+        if old and new > old * (1 + threshold) and new - old > floor:
+            regressions.append(f"{label}: {old:,.1f} -> {new:,.1f} (+{(new / old - 1):.0%})")
+
+    for r in current["results"]:
+        b = base.get((r["case"], r["dpi"]))
+        if b is None:
+            continue
+        prefix = f"{r['case']} @ {r['dpi']}dpi"
+        for stage, timing in r["stages"].items():
+            if stage in b["stages"]:
+                check(f"{prefix} {stage} ms", b["stages"][stage]["wall_ms"], timing["wall_ms"],
+                      MIN_REGRESSION_MS)
+        check(f"{prefix} total ms", b["total"]["wall_ms"], r["total"]["wall_ms"], MIN_REGRESSION_MS)
+        check(f"{prefix} peak RSS KiB", b["peak_rss_kb"], r["peak_rss_kb"])
+        check(f"{prefix} output bytes", b["output_bytes"], r["output_bytes"])
+    return regressions
+
+
+# --- Parity ---
+
+# Short, wrapping, escaped, padded, multi-paragraph and non-ASCII text, then
+# checkbox states. Text outside WinAnsi is refused by the writer and skipped.
+PARITY_VALUES = [
+    "SAMPLE 1234",
+    "The quick brown fox jumps over the lazy dog (again) \\ " * 3,
+    "  padded  ",
+    "first line\nsecond line",
+    "Ünïcødé ½ – ‘quotes’ €",
+    True,
+    False,
+]
+
+_PDF_TOKEN = re.compile(rb"\((?:\\.|[^\\)])*\)|\S+")
+
+
+def _same_stream(a: bytes, b: bytes, tolerance: float = 0.01) -> bool:
+    """Content streams equal token by token, numbers to within `tolerance`."""
+    ta, tb = _PDF_TOKEN.findall(a or b""), _PDF_TOKEN.findall(b or b"")
+    if len(ta) != len(tb):
+        return False
+    for x, y in zip(ta, tb):
+        try:
+            if abs(float(x) - float(y)) > tolerance:
+                return False
+        except ValueError:
+            if x != y:
+                return False
+    return True
+
+
+def _appearances(doc: fitz.Document, xref: int) -> dict[str, bytes]:
+    """State name ("" for a text field) -> normal appearance stream."""
+    kind, value = doc.xref_get_key(xref, "AP/N")
+    if kind == "xref":
+        return {"": doc.xref_stream(int(value.split()[0]))}
+    return {state: doc.xref_stream(int(ref))
+            for state, ref in re.findall(r"/([^\s/<>]+)\s+(\d+)\s+0\s+R", value)}
+
+
+def _field_state(doc: fitz.Document, spec) -> tuple:
+    value = doc.xref_get_key(spec.value_xref, "V")[1].lstrip("/")  # name or string
+    return value, doc.xref_get_key(spec.xref, "AS")[1]
+
+
+def run_parity(dpi: int) -> int:
+    """Compare field_writer against widget.update() on every shipped blank.
+
+    Returns the number of mismatching widgets and pages.
+    """
+    failures = 0
+    print(f"{'blank':32s} {'value':16s} {'fields':>6s} {'update ms':>10s} {'direct ms':>10s} "
+          f"{'mismatch':>8s}")
+    for blank in shipped_blanks():
+        template = get_template(blank)
+        for value in PARITY_VALUES:
+            kind = "checkbox" if isinstance(value, bool) else "text"
+            direct, reference = template.open(), template.open()
+            writer = AppearanceWriter(direct)
+            specs = []
+            start = time.perf_counter()
+            for spec in template.specs.values():
+                if spec.kind == kind and writer.write(spec, value):
+                    specs.append(spec)
+            direct_time = time.perf_counter() - start
+
+            pages = {entry["xref"]: entry["page"]
+                     for entries in template.widgets.values() for entry in entries}
+            loaded = {}
+            start = time.perf_counter()
+            for spec in specs:
+                page = pages[spec.xref]
+                if page not in loaded:
+                    loaded[page] = reference[page]
+                widget = loaded[page].load_widget(spec.xref)
+                widget.field_value = value
+                widget.update()
+            update_time = time.perf_counter() - start
+
+            mismatches = []
+            for spec in specs:
+                want, got = _appearances(reference, spec.xref), _appearances(direct, spec.xref)
+                if (_field_state(reference, spec) != _field_state(direct, spec)
+                        or want.keys() != got.keys()
+                        or not all(_same_stream(want[k], got[k]) for k in want)):
+                    mismatches.append(f"xref {spec.xref}")
+            for page in sorted({pages[spec.xref] for spec in specs}):
+                want = reference[page].get_pixmap(dpi=dpi).samples
+                if direct[page].get_pixmap(dpi=dpi).samples != want:
+                    mismatches.append(f"page {page + 1} render")
+            direct.close()
+            reference.close()
+
+            failures += len(mismatches)
+            label = repr(value)[:16]
+            print(f"{os.path.basename(blank):32s} {label:16s} {len(specs):6d} "
+                  f"{update_time * 1000:10.1f} {direct_time * 1000:10.1f} {len(mismatches):8d}")
+            for line in mismatches[:5]:
+                print(f"    {line}")
+    print()
+    print("Parity OK" if not failures else f"{failures} mismatch(es)")
+    return failures
+
+
+# --- CLI ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ACORD filler benchmarks")
+    sub = parser.add_subparsers(dest="command")
+
+    fl = sub.add_parser("flatten", help="Compare raster vs vector flattening on every shipped blank")
+    fl.add_argument("--dpi", type=int, default=200, help="DPI for raster mode")
+    fl.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+
+    wk = sub.add_parser("workers", help="Parallel rasterization speedup on the 125/126/140 packet")
+    wk.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    wk.add_argument("--dpi", type=int, default=200)
+    wk.add_argument("--repeat", type=int, default=3)
+
+    en = sub.add_parser("encodings", help="Encode time and size of each raster page encoding")
+    en.add_argument("--dpi", type=int, default=200)
+    en.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY)
+    en.add_argument("--repeat", type=int, default=3)
+
+    st = sub.add_parser("suite", help="Every filler and stage, at several DPIs")
+    st.add_argument("--dpi", type=int, nargs="+", default=[150, 200, 300])
+    st.add_argument("--repeat", type=int, default=3)
+    st.add_argument("--ocr", action="store_true", help="Include the OCR stage (needs ocrmypdf)")
+    st.add_argument("--output", help="Write results to this JSON baseline")
+
+    cp = sub.add_parser("compare", help="Re-run the suite and fail on regressions vs a baseline")
+    cp.add_argument("baseline", help="Baseline JSON written by `suite --output`")
+    cp.add_argument("--threshold", type=float, default=0.2,
+                    help="Allowed relative slowdown/growth (default: 0.2 = 20%%)")
+    cp.add_argument("--repeat", type=int, default=3)
+    cp.add_argument("--output", help="Also write the new results here")
+
+    pa = sub.add_parser("parity", help="Direct field writer vs widget.update() on every blank")
+    pa.add_argument("--dpi", type=int, default=100, help="DPI for the page render comparison")
+
+    args = parser.parse_args()
+
+    if args.command == "flatten":
+        run_flatten(args.dpi, args.repeat)
+    elif args.command == "workers":
+        run_workers(args.max_workers, args.dpi, args.repeat)
+    elif args.command == "encodings":
+        run_encodings(args.dpi, args.jpeg_quality, args.repeat)
+    elif args.command == "suite":
+        run_suite(args.dpi, args.repeat, args.ocr, args.output)
+    elif args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        dpis = sorted({r["dpi"] for r in baseline["results"]})
+        cases = {r["case"] for r in baseline["results"]}
+        current = run_suite(dpis, args.repeat, baseline["meta"]["ocr"], args.output, cases)
+        regressions = compare(baseline, current, args.threshold)
+        print()
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%}")
+    elif args.command == "parity":
+        sys.exit(1 if run_parity(args.dpi) else 0)
+    else:
+        parser.print_help()
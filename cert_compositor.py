@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Certificate Compositor — Raster-flatten many holder variations of one ACORD 25.
+
+For a given policy, every certificate holder gets the same page except for
+the holder block, the remarks and the AI/WOS codes (see
+map_cert_holder_acord25). The compositor renders the policy-common page
+once, keeps the base pixmap, and for each holder only renders the widget
+rects the holder fields touch, blitting those clips onto a copy of the base.
+
+An N-holder run becomes one full-page rasterization plus N sets of small
+clips. Output is pixel-identical to filling everything and calling
+rasterize(); with searchable=True each page also gets the invisible text
+layer of flatten mode "searchable".
+
+Usage:
+    from cert_compositor import get_compositor
+    compositor = get_compositor("acord-25-blank.pdf", map_to_acord25(policy, {}, agency))
+    pdf_bytes, stats = compositor.render(map_cert_holder_acord25(policy, holder))
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from form_template import field_text_layer, fill_fields, get_template
+from pdf_flatten import DEFAULT_JPEG_QUALITY, add_text_layer, insert_page_image
+from stage_timings import NULL_TIMINGS
+
+# Base pixmaps kept per process. A 200dpi ACORD 25 page is ~5MB of samples.
+DEFAULT_CACHE_SIZE = 4
+
+# Clips are grown by this much (points) so anti-aliased edges come along too
+CLIP_PAD = 1
+
+
+class CertificateCompositor:
+    """One policy's base page(s) rendered once, ready for per-holder clips.
+
+    Attributes:
+        template: FormTemplate of the blank.
+        base_fields: Policy-common field data (holder fields left out).
+        dpi: Render resolution.
+        encoding / quality: Page image encoding, as for rasterize().
+        searchable: Add the invisible text layer of the filled values.
+        base: Dict page index -> base Pixmap (RGB, no alpha).
+    """
+
+    def __init__(self, blank_path: str, base_fields: dict, dpi: int = 200,
+                 encoding: str = "rgb", quality: int = DEFAULT_JPEG_QUALITY,
+                 searchable: bool = False):
+        self.template = get_template(blank_path)
+        self.base_fields = dict(base_fields)
+        self.dpi = dpi
+        self.encoding = encoding
+        self.quality = quality
+        self.searchable = searchable
+        self.matrix = fitz.Matrix(dpi / 72, dpi / 72)
+
+        doc = self.template.open()
+        fill_fields(doc, self.template, self.base_fields)
+        self.page_rects = [page.rect for page in doc]
+        self.base = {i: doc[i].get_pixmap(matrix=self.matrix) for i in range(len(doc))}
+        doc.close()
+
+    def _clip_rects(self, holder_fields: dict) -> dict[int, list[fitz.Rect]]:
+        """Page -> padded rects covering every widget the holder fields name."""
+        rects = {}
+        for name in holder_fields:
+            for entry in self.template.widgets.get(name, ()):
+                rect = fitz.Rect(entry["rect"])
+                if rect.is_empty:
+                    continue
+                rect = (rect + (-CLIP_PAD, -CLIP_PAD, CLIP_PAD, CLIP_PAD)) & self.page_rects[entry["page"]]
+                rects.setdefault(entry["page"], []).append(rect)
+        return rects
+
+    def _overlapping_base(self, clips: dict[int, list[fitz.Rect]], holder_fields: dict) -> dict:
+        """Base fields whose widgets show through a clip — they must be in the clip render too."""
+        overlap = {}
+        for name, value in self.base_fields.items():
+            if name in holder_fields:
+                continue
+            for entry in self.template.widgets.get(name, ()):
+                rect = fitz.Rect(entry["rect"])
+                if any(rect.intersects(clip) for clip in clips.get(entry["page"], ())):
+                    overlap[name] = value
+                    break
+        return overlap
+
+    def render(self, holder_fields: dict, timings=None) -> tuple[bytes, dict]:
+        """Composite one holder's certificate onto the base.
+
+        Returns:
+            (pdf_bytes, stats) — stats shaped like fill_to_bytes's
+        """
+        timer = timings if timings is not None else NULL_TIMINGS
+        clips = self._clip_rects(holder_fields)
+        with timer.stage("load"):
+            doc = self.template.open()
+        with timer.stage("fill"):
+            fill_fields(doc, self.template,
+                        {**self._overlapping_base(clips, holder_fields), **holder_fields})
+
+        fields = {**self.base_fields, **holder_fields}
+        text_layer = field_text_layer(self.template, fields) if self.searchable else {}
+        dst = fitz.open()
+        encode_time = 0.0
+        for i, rect in enumerate(self.page_rects):
+            with timer.stage("composite"):
+                pix = fitz.Pixmap(self.base[i], 0)  # copy; alpha=0 keeps it blit-compatible
+                page = doc[i]
+                for clip in clips.get(i, ()):
+                    part = page.get_pixmap(matrix=self.matrix, clip=clip)
+                    pix.copy(part, part.irect)
+            with timer.stage("encode"):
+                start = time.perf_counter()
+                insert_page_image(dst, rect, pix, self.encoding, self.quality)
+                encode_time += time.perf_counter() - start
+            if self.searchable:
+                with timer.stage("text_layer"):
+                    add_text_layer(dst[-1], text_layer.get(i))
+        doc.close()
+
+        with timer.stage("save") as stage:
+            pdf_bytes = dst.tobytes(deflate=True)
+            stage.bytes = len(pdf_bytes)
+        dst.close()
+
+        widgets = self.template.widgets
+        stats = {
+            "filled_count": sum(len(widgets[name]) for name in fields if name in widgets),
+            "total_fields": len(widgets),
+            "skipped_fields": [name for name in fields if name not in widgets],
+            "encode_ms": round(encode_time * 1000, 1),
+            "encoding": self.encoding,
+            "output_bytes": len(pdf_bytes),
+        }
+        if timings is not None:
+            stats["timings"] = timings.as_dict()
+        return pdf_bytes, stats
+
+
+def _cache_key(blank_path: str, base_fields: dict, dpi: int, encoding: str, quality: int,
+               searchable: bool) -> tuple:
+    template = get_template(blank_path)
+    fields = json.dumps(base_fields, sort_keys=True, default=str)
+    return (template.path, template.sha256, hashlib.sha256(fields.encode()).hexdigest(),
+            dpi, encoding, quality, searchable)
+
+
+_compositors: "OrderedDict[tuple, CertificateCompositor]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_compositor(blank_path: str, base_fields: dict, dpi: int = 200, encoding: str = "rgb",
+                   quality: int = DEFAULT_JPEG_QUALITY,
+                   searchable: bool = False) -> CertificateCompositor:
+    """Fetch (or build) the compositor for one policy from the per-process LRU.
+
+    Keyed by the blank's content hash and a hash of the base fields, so
+    render-pool workers each build a policy's base page once per bulk run.
+    """
+    key = _cache_key(blank_path, base_fields, dpi, encoding, quality, searchable)
+    with _lock:
+        compositor = _compositors.get(key)
+        if compositor is not None:
+            _compositors.move_to_end(key)
+            return compositor
+
+    compositor = CertificateCompositor(blank_path, base_fields, dpi=dpi,
+                                       encoding=encoding, quality=quality,
+                                       searchable=searchable)
+    with _lock:
+        _compositors[key] = compositor
+        _compositors.move_to_end(key)
+        while len(_compositors) > DEFAULT_CACHE_SIZE:
+            _compositors.popitem(last=False)
+    return compositor
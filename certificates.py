@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Certificate Rendering — Fill, flatten and sign a single certificate.
+
+Everything here is plain bytes in, bytes out, with no server state, so it
+can run in-process or inside a process-pool worker (PyMuPDF is not
+thread-safe, so concurrent renders have to live in separate processes).
+The helpers that read uploaded PDFs for extraction live here for the
+same reason.
+
+Usage:
+    from certificates import pdf_page_count, render_certificate
+    pdf_bytes, stats = render_certificate(blank_path, field_data, signature="Jane Doe")
+    pages = pdf_page_count(upload_path)
+"""
+
+import base64
+import os
+import traceback
+
+import fitz  # PyMuPDF
+
+from cert_compositor import get_compositor
+from fill_acord import fill_to_bytes
+from stage_timings import NULL_TIMINGS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIGNATURE_FONT = os.path.join(BASE_DIR, "DancingScript.ttf")
+
+# Signature placement — authorized representative area on ACORD 25
+SIGNATURE_RECT = (320, 720, 580, 745)
+
+
+def stamp_signature(pdf_bytes: bytes, signature: str) -> bytes:
+    """Overlay an image (data: URL) or typed signature on page 1."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    page = doc[0]
+    sig_rect = fitz.Rect(*SIGNATURE_RECT)
+
+    if signature.startswith("data:image"):
+        # Image signature
+        sig_data = signature.split(",", 1)[1]
+        sig_bytes = base64.b64decode(sig_data)
+        page.insert_image(sig_rect, stream=sig_bytes)
+    else:
+        # Typed signature — render in cursive font
+        if os.path.exists(SIGNATURE_FONT):
+            page.insert_font(fontname="cursive", fontfile=SIGNATURE_FONT)
+            # Center the text in the signature area
+            font_size = 18
+            text_width = len(signature) * font_size * 0.45
+            x = sig_rect.x0 + (sig_rect.width - text_width) / 2
+            y = sig_rect.y0 + 18
+            page.insert_text((x, y), signature, fontname="cursive", fontsize=font_size, color=(0.05, 0.05, 0.15))
+        else:
+            # Fallback: use Helvetica italic-ish
+            page.insert_text((sig_rect.x0 + 10, sig_rect.y0 + 16), signature, fontname="helv", fontsize=14, color=(0.05, 0.05, 0.15))
+
+    out = doc.tobytes()
+    doc.close()
+    return out
+
+
+def render_certificate(blank_path: str, field_data: dict, signature: str = "",
+                       flatten=True, timings=None) -> tuple[bytes, dict]:
+    """Fill, flatten and (optionally) sign one certificate.
+
+    A failed signature overlay doesn't fail the certificate: the unsigned PDF
+    is returned and the error is reported in stats so the caller can log it.
+    Pass a StageTimings as `timings` to get stats["timings"].
+
+    Returns:
+        (pdf_bytes, stats) — stats as from fill_to_bytes, plus
+        signature_error / signature_traceback (None when all went well)
+    """
+    pdf_bytes, stats = fill_to_bytes(blank_path, field_data, flatten=flatten, timings=timings)
+    return _sign(pdf_bytes, stats, signature, timings)
+
+
+def render_composited(blank_path: str, base_fields: dict, holder_fields: dict,
+                      signature: str = "", searchable: bool = False,
+                      timings=None) -> tuple[bytes, dict]:
+    """Raster certificate for one holder of a bulk run, via the compositor.
+
+    `base_fields` is the policy-common mapping shared by every holder; its
+    page is rendered once per process and only the holder's widgets are
+    re-rendered on top. Same output and stats as
+    render_certificate(blank_path, {**base_fields, **holder_fields}, signature),
+    with flatten="searchable" when `searchable` is set.
+    """
+    compositor = get_compositor(blank_path, base_fields, searchable=searchable)
+    pdf_bytes, stats = compositor.render(holder_fields, timings)
+    return _sign(pdf_bytes, stats, signature, timings)
+
+
+def _sign(pdf_bytes: bytes, stats: dict, signature: str, timings=None) -> tuple[bytes, dict]:
+    stats["signature_error"] = stats["signature_traceback"] = None
+
+    if signature:
+        timer = timings if timings is not None else NULL_TIMINGS
+        with timer.stage("signature") as stage:
+            try:
+                pdf_bytes = stamp_signature(pdf_bytes, signature)
+            except Exception as e:
+                stats["signature_error"] = str(e)
+                stats["signature_traceback"] = traceback.format_exc()
+            stage.bytes = len(pdf_bytes)
+        stats["output_bytes"] = len(pdf_bytes)
+
+    if timings is not None:
+        stats["timings"] = timings.as_dict()
+    return pdf_bytes, stats
+
+
+def merge_pdfs(pdfs: list[bytes]) -> bytes:
+    """Concatenate several PDFs into one document."""
+    merged = fitz.open()
+    for pdf_bytes in pdfs:
+        src = fitz.open(stream=pdf_bytes, filetype="pdf")
+        merged.insert_pdf(src)
+        src.close()
+    out = merged.tobytes(deflate=True)
+    merged.close()
+    return out
+
+
+# ── Uploaded PDFs ──
+
+# These take a file path rather than bytes: MuPDF reads the file on demand,
+# and a path is all that has to be pickled over to a render-pool worker.
+
+def pdf_page_count(pdf_path: str) -> int:
+    """Page count of a PDF on disk; raises if MuPDF can't open it as a PDF."""
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        if not doc.is_pdf:
+            raise ValueError("not a PDF")
+        return doc.page_count
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    doc = fitz.open(pdf_path, filetype="pdf")
+    text = ""
+    for page in doc:
+        text += page.get_text() + "\n"
+    doc.close()
+    return text
+
+
+def pdf_pages_to_images(pdf_path: str, dpi: int = 150, max_pages: int = None) -> list[str]:
+    doc = fitz.open(pdf_path, filetype="pdf")
+    images = []
+    for page in doc.pages(0, max_pages):
+        pix = page.get_pixmap(dpi=dpi)
+        img_bytes = pix.tobytes("png")
+        images.append(base64.b64encode(img_bytes).decode())
+    doc.close()
+    return images
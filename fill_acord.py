@@ -6,8 +6,11 @@ Usage:
     python fill_acord.py --blank acord-125-126-140-blank.pdf --data policy_data.json --output filled.pdf [--flatten]
 
 Or import and use programmatically:
-    from fill_acord import fill_acord_form
+    from fill_acord import fill_acord_form, fill_to_bytes
     fill_acord_form(blank_path, field_data, output_path, flatten=True)
+    pdf_bytes, stats = fill_to_bytes(blank_path, field_data, flatten=True)
+    pdf_bytes, stats = fill_to_bytes(blank_path, field_data, encoding="bilevel")
+    pdf_bytes, stats = fill_to_bytes(blank_path, field_data, timings=StageTimings())
 """
 
 import fitz  # PyMuPDF
@@ -15,6 +18,11 @@ import json
 import argparse
 import os
 
+from form_template import field_text_layer, fill_fields, get_template
+from pdf_flatten import (DEFAULT_JPEG_QUALITY, ENCODINGS, FLATTEN_MODES, RASTER_MODES,
+                         flatten_document, flatten_mode)
+from stage_timings import NULL_TIMINGS, StageTimings, format_timings
+
 
 def list_fields(blank_pdf_path):
     """List all fillable field names in a blank ACORD PDF."""
@@ -31,71 +39,106 @@ def list_fields(blank_pdf_path):
     return fields
 
 
-def fill_acord_form(blank_pdf_path, field_data, output_path, flatten=True, dpi=200):
+def fill_to_bytes(blank_pdf_path, field_data, flatten=True, dpi=200, workers=1,
+                  encoding="rgb", quality=DEFAULT_JPEG_QUALITY, timings=None):
     """
-    Fill an ACORD PDF form with provided field data.
+    Fill an ACORD PDF form entirely in memory.
+    
+    Nothing touches disk except the (cached) blank, so concurrent callers
+    can't clobber each other's output.
     
     Args:
         blank_pdf_path: Path to blank fillable ACORD PDF
         field_data: Dict of {field_name: value} to fill
-        output_path: Where to save the filled PDF
-        flatten: If True, render to images (non-editable). If False, keep editable.
-        dpi: Resolution for flattening (default 200)
+        flatten: "raster" (or True) renders to images, "searchable" adds
+            an invisible text layer of the filled values on top, "vector"
+            bakes the field appearances into the page. All are
+            non-editable. False keeps the form editable.
+        dpi: Resolution for raster flattening (default 200)
+        workers: Processes to rasterize pages with (default 1)
+        encoding: Raster page encoding — "rgb" (default), "gray",
+            "bilevel" (1-bit, smallest for forms) or "jpeg"
+        quality: JPEG quality for encoding="jpeg" (default 75)
+        timings: Optional StageTimings to record load/fill/flatten/save into
     
     Returns:
-        Dict with stats: filled_count, total_fields, skipped_fields
+        Tuple of (pdf_bytes, stats) where stats is the same dict
+        fill_acord_form returns
     """
-    doc = fitz.open(blank_pdf_path)
-    
-    filled_count = 0
-    skipped = []
+    timer = timings if timings is not None else NULL_TIMINGS
+    with timer.stage("load"):
+        template = get_template(blank_pdf_path)
+        doc = template.open()
     
-    # Fill form fields
-    for page in doc:
-        for widget in page.widgets():
-            fname = widget.field_name
-            if fname in field_data:
-                widget.field_value = str(field_data[fname])
-                widget.update()
-                filled_count += 1
-    
-    # Check for fields in data that weren't found in form
-    all_field_names = set()
-    for page in doc:
-        for widget in page.widgets():
-            all_field_names.add(widget.field_name)
+    # Fill only the supplied fields via the template's widget index
+    with timer.stage("fill"):
+        filled_count, skipped = fill_fields(doc, template, field_data)
     
-    for key in field_data:
-        if key not in all_field_names:
-            skipped.append(key)
+    stats = {
+        "filled_count": filled_count,
+        "total_fields": len(template.widgets),
+        "skipped_fields": skipped,
+    }
     
-    if flatten:
-        # Render to images and rebuild as non-editable PDF
-        doc.save("/tmp/_acord_temp_filled.pdf")
-        doc.close()
-        
-        src = fitz.open("/tmp/_acord_temp_filled.pdf")
-        dst = fitz.open()
-        for page in src:
-            pix = page.get_pixmap(dpi=dpi)
-            img_page = dst.new_page(width=page.rect.width, height=page.rect.height)
-            img_page.insert_image(page.rect, pixmap=pix)
-        
-        dst.save(output_path, deflate=True)
+    mode = flatten_mode(flatten)
+    if mode:
+        # Rebuild as a non-editable PDF. The filled doc renders identically
+        # to a saved/reopened copy, so flatten it directly.
+        with timer.stage("flatten"):
+            text_layer = field_text_layer(template, field_data) if mode == "searchable" else None
+            dst = flatten_document(doc, mode=mode, dpi=dpi, workers=workers,
+                                   encoding=encoding, quality=quality, stats=stats,
+                                   text_layer=text_layer)
+        with timer.stage("save") as stage:
+            pdf_bytes = dst.tobytes(deflate=True)
+            stage.bytes = len(pdf_bytes)
         dst.close()
-        src.close()
-        
-        # Clean up temp
-        os.remove("/tmp/_acord_temp_filled.pdf")
+        if mode in RASTER_MODES:
+            stats["encoding"] = encoding
     else:
-        doc.save(output_path)
-        doc.close()
+        with timer.stage("save") as stage:
+            pdf_bytes = doc.tobytes()
+            stage.bytes = len(pdf_bytes)
+    doc.close()
     
-    return {
-        "filled_count": filled_count,
-        "total_fields": len(all_field_names),
-        "skipped_fields": skipped,
-    }
+    stats["output_bytes"] = len(pdf_bytes)
+    if timings is not None:
+        stats["timings"] = timings.as_dict()
+    return pdf_bytes, stats
+
+
+def fill_acord_form(blank_pdf_path, field_data, output_path, flatten=True, dpi=200, workers=1,
+                    encoding="rgb", quality=DEFAULT_JPEG_QUALITY, timings=None):
+    """
+    Fill an ACORD PDF form with provided field data.
+    
+    Args:
+        blank_pdf_path: Path to blank fillable ACORD PDF
+        field_data: Dict of {field_name: value} to fill
+        output_path: Where to save the filled PDF
+        flatten: "raster"/True, "searchable", "vector", or False — see fill_to_bytes
+        dpi: Resolution for raster flattening (default 200)
+        workers: Processes to rasterize pages with (default 1)
+        encoding: Raster page encoding (rgb, gray, bilevel, jpeg — default rgb)
+        quality: JPEG quality for encoding="jpeg" (default 75)
+        timings: Optional StageTimings; adds a "write" stage to fill_to_bytes's
+    
+    Returns:
+        Dict with stats: filled_count, total_fields, skipped_fields,
+        output_bytes, encoding / encode_ms for raster output, and
+        timings (per-stage wall_ms/cpu_ms/bytes) when requested
+    """
+    pdf_bytes, stats = fill_to_bytes(blank_pdf_path, field_data, flatten=flatten, dpi=dpi,
+                                     workers=workers, encoding=encoding, quality=quality,
+                                     timings=timings)
+    timer = timings if timings is not None else NULL_TIMINGS
+    with timer.stage("write") as stage:
+        with open(output_path, "wb") as f:
+            f.write(pdf_bytes)
+        stage.bytes = len(pdf_bytes)
+    if timings is not None:
+        stats["timings"] = timings.as_dict()
+    return stats
 
 
 def add_broker_notes(pdf_path, notes, output_path=None):
@@ -208,7 +251,16 @@ if __name__ == "__main__":
     fill.add_argument("--data", required=True, help="JSON file with field_name: value pairs")
     fill.add_argument("--output", required=True, help="Output PDF path")
     fill.add_argument("--flatten", action="store_true", help="Flatten to non-editable")
+    fill.add_argument("--flatten-mode", choices=FLATTEN_MODES, default="raster",
+                      help="raster = render to images, searchable = images + invisible text "
+                           "layer, vector = bake field appearances")
     fill.add_argument("--dpi", type=int, default=200, help="DPI for flattening")
+    fill.add_argument("--workers", type=int, default=1, help="Processes to rasterize pages with")
+    fill.add_argument("--encoding", choices=ENCODINGS, default="rgb",
+                      help="Raster page encoding (bilevel is smallest for forms)")
+    fill.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY,
+                      help="JPEG quality for --encoding jpeg")
+    fill.add_argument("--timings", action="store_true", help="Print per-stage timings")
     
     # Extract pages
     ext = sub.add_parser("extract", help="Extract PDF pages as images for OCR")
@@ -228,11 +280,19 @@ if __name__ == "__main__":
     elif args.command == "fill":
         with open(args.data) as f:
             field_data = json.load(f)
-        result = fill_acord_form(args.blank, field_data, args.output, flatten=args.flatten, dpi=args.dpi)
+        result = fill_acord_form(args.blank, field_data, args.output,
+                                 flatten=args.flatten and args.flatten_mode, dpi=args.dpi,
+                                 workers=args.workers, encoding=args.encoding,
+                                 quality=args.jpeg_quality,
+                                 timings=StageTimings() if args.timings else None)
         print(f"Filled {result['filled_count']} of {result['total_fields']} fields")
         if result['skipped_fields']:
             print(f"Skipped (not found in form): {result['skipped_fields']}")
-        print(f"Saved to {args.output}")
+        if "encode_ms" in result:
+            print(f"Encoded as {result['encoding']} in {result['encode_ms']:.0f}ms")
+        print(f"Saved to {args.output} ({result['output_bytes']:,} bytes)")
+        if "timings" in result:
+            print(format_timings(result["timings"]))
     
     elif args.command == "extract":
         paths = extract_policy_pages(args.pdf, args.output_dir, args.dpi)
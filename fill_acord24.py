@@ -10,9 +10,14 @@ Usage:
 import fitz
 import json
 import argparse
-import subprocess
 import os
 
+from form_template import field_text_layer, fill_fields, get_template
+from ocr_service import ocr_pdf
+from pdf_flatten import (DEFAULT_JPEG_QUALITY, ENCODINGS, FLATTEN_MODES, flatten_document,
+                         flatten_mode)
+from stage_timings import NULL_TIMINGS, StageTimings, format_timings
+
 
 FIELD_MAP = {
     "Form_CompletionDate_A": "date",
@@ -71,57 +76,90 @@ CHECKBOX_MAP = {
 
 
 def fill_acord24(data: dict, form_path: str, output_path: str,
-                  signature_path: str = None, ocr: bool = True):
-    doc = fitz.open(form_path)
-    filled_t = filled_c = 0
-
-    for widget in doc[0].widgets():
-        fname = widget.field_name
-        if fname in FIELD_MAP:
-            key = FIELD_MAP[fname]
-            value = data.get(key, "")
-            if value:
-                widget.field_value = str(value)
-                widget.update()
-                filled_t += 1
-        elif fname in CHECKBOX_MAP:
-            key = CHECKBOX_MAP[fname]
-            if data.get(key):
-                widget.field_value = True
-                widget.update()
-                filled_c += 1
-
-    pix = doc[0].get_pixmap(dpi=200)
-    dst = fitz.open()
-    page = dst.new_page(width=doc[0].rect.width, height=doc[0].rect.height)
-    page.insert_image(doc[0].rect, pixmap=pix)
-    doc.close()
+                  signature_path: str = None, ocr: bool = True,
+                  flatten: str = "searchable", encoding: str = "rgb",
+                  quality: int = DEFAULT_JPEG_QUALITY, dpi: int = 200,
+                  timings: StageTimings = None):
+    """Fill an ACORD 24 Certificate of Property Insurance.
+
+    Args:
+        data: Dictionary with form field values
+        form_path: Path to blank ACORD 24 PDF
+        output_path: Path for output PDF
+        signature_path: Optional path to signature image
+        ocr: OCR the output (flatten="raster" only — the other modes are
+            already searchable)
+        flatten: "searchable" (default) renders to an image with an
+            invisible text layer of the filled values; "raster" is the image
+            alone (pair with ocr); "vector" bakes the field appearances.
+            True means "raster" and False leaves the form editable.
+        encoding: Raster image encoding — rgb, gray, bilevel or jpeg
+        quality: JPEG quality for encoding="jpeg"
+        dpi: Render resolution for raster flattening
+        timings: Optional StageTimings; per-stage timings come back in the result
+
+    Returns:
+        dict with fill stats
+    """
+    timer = timings if timings is not None else NULL_TIMINGS
+    with timer.stage("load"):
+        template = get_template(form_path)
+        doc = template.open()
+
+    with timer.stage("map"):
+        text_values = {fname: str(data[key]) for fname, key in FIELD_MAP.items() if data.get(key)}
+        checked = {fname for fname, key in CHECKBOX_MAP.items() if data.get(key)}
+
+    with timer.stage("fill"):
+        filled_t, _ = fill_fields(doc, template, text_values)
+        filled_c, _ = fill_fields(doc, template, {fname: True for fname in checked
+                                                  if fname not in text_values})
+        text_layer = field_text_layer(template, text_values)  # for searchable mode
+
+    mode = flatten_mode(flatten)
+    stats = {}
+    with timer.stage("flatten"):
+        if mode:
+            dst = flatten_document(doc, mode=mode, dpi=dpi, pages=[0], encoding=encoding,
+                                   quality=quality, stats=stats, text_layer=text_layer)
+            doc.close()
+        else:
+            dst = doc  # left editable
+            dst.select([0])
+    page = dst[0]
 
     if signature_path and os.path.exists(signature_path):
-        from PIL import Image
-        img = Image.open(signature_path)
-        aspect = img.size[0] / img.size[1]
-        sig_h = 22
-        sig_w = int(sig_h * aspect)
-        sig_x = 310 + (280 - sig_w) // 2
-        sig_rect = fitz.Rect(sig_x, 721, sig_x + sig_w, 721 + sig_h)
-        page.insert_image(sig_rect, filename=signature_path)
-
-    if ocr:
-        tmp = output_path + ".tmp.pdf"
-        dst.save(tmp, deflate=True)
+        with timer.stage("signature"):
+            from PIL import Image
+            img = Image.open(signature_path)
+            aspect = img.size[0] / img.size[1]
+            sig_h = 22
+            sig_w = int(sig_h * aspect)
+            sig_x = 310 + (280 - sig_w) // 2
+            sig_rect = fitz.Rect(sig_x, 721, sig_x + sig_w, 721 + sig_h)
+            page.insert_image(sig_rect, filename=signature_path)
+
+    if ocr and mode == "raster":
+        with timer.stage("save") as stage:
+            pdf_bytes = dst.tobytes(deflate=True)
+            stage.bytes = len(pdf_bytes)
         dst.close()
-        try:
-            subprocess.run(["ocrmypdf", "--skip-text", "--optimize", "1", tmp, output_path],
-                          capture_output=True, timeout=60)
-            os.remove(tmp)
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            os.rename(tmp, output_path)
+        with timer.stage("ocr") as stage:
+            pdf_bytes, ocr_stats = ocr_pdf(pdf_bytes)
+            with open(output_path, "wb") as f:
+                f.write(pdf_bytes)
+            stage.bytes = len(pdf_bytes)
+        stats.update(ocr_stats)
     else:
-        dst.save(output_path, deflate=True)
+        with timer.stage("save") as stage:
+            dst.save(output_path, deflate=True)
+            stage.bytes = os.path.getsize(output_path)
         dst.close()
 
-    return {"text_fields": filled_t, "checkboxes": filled_c, "output": output_path}
+    if timings is not None:
+        stats["timings"] = timings.as_dict()
+    return {"text_fields": filled_t, "checkboxes": filled_c, "output": output_path,
+            "output_bytes": os.path.getsize(output_path), **stats}
 
 
 def main():
@@ -130,15 +168,30 @@ def main():
     parser.add_argument("--form", required=True, help="Blank ACORD 24 PDF")
     parser.add_argument("--output", required=True, help="Output PDF path")
     parser.add_argument("--signature", help="Path to signature image")
-    parser.add_argument("--no-ocr", action="store_true", help="Skip OCR text layer")
+    parser.add_argument("--no-ocr", action="store_true",
+                        help="Skip OCR (only raster output is OCR'd; the other modes "
+                             "are already searchable)")
+    parser.add_argument("--flatten-mode", choices=FLATTEN_MODES, default="searchable",
+                        help="searchable = image + invisible text layer, raster = image only "
+                             "(OCR'd unless --no-ocr), vector = bake field appearances")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="rgb",
+                        help="Raster image encoding (bilevel is smallest)")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY,
+                        help="JPEG quality for --encoding jpeg")
+    parser.add_argument("--timings", action="store_true", help="Print per-stage timings")
     args = parser.parse_args()
 
     with open(args.input) as f:
         data = json.load(f)
 
     result = fill_acord24(data, args.form, args.output,
-                           signature_path=args.signature, ocr=not args.no_ocr)
+                           signature_path=args.signature, ocr=not args.no_ocr,
+                           flatten=args.flatten_mode, encoding=args.encoding,
+                           quality=args.jpeg_quality,
+                           timings=StageTimings() if args.timings else None)
     print(f"Done: {result['text_fields']} text + {result['checkboxes']} checkboxes -> {result['output']}")
+    if "timings" in result:
+        print(format_timings(result["timings"]))
 
 
 if __name__ == "__main__":
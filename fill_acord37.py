@@ -31,13 +31,17 @@ Input JSON schema:
 }
 """
 
-import fitz
 import json
 import argparse
-import subprocess
 import os
 from datetime import date
 
+from form_template import field_text_layer, fill_fields, get_template
+from ocr_service import ocr_pdf
+from pdf_flatten import (DEFAULT_JPEG_QUALITY, ENCODINGS, FLATTEN_MODES, flatten_document,
+                         flatten_mode)
+from stage_timings import NULL_TIMINGS, StageTimings, format_timings
+
 
 # Field name -> JSON key mapping
 FIELD_MAP = {
@@ -71,57 +75,76 @@ FIELD_MAP = {
 }
 
 
-def fill_acord37(data: dict, form_path: str, output_path: str, ocr: bool = True):
+def fill_acord37(data: dict, form_path: str, output_path: str, ocr: bool = True,
+                 flatten: str = "searchable", encoding: str = "rgb",
+                 quality: int = DEFAULT_JPEG_QUALITY, dpi: int = 200,
+                 timings: StageTimings = None):
     """Fill an ACORD 37 Statement of No Loss form.
     
     Args:
         data: Dictionary with form field values
         form_path: Path to blank ACORD 37 PDF
         output_path: Path for output PDF
-        ocr: Whether to add OCR text layer (requires ocrmypdf + tesseract)
+        ocr: OCR the output (flatten="raster" only, requires ocrmypdf +
+            tesseract — the other modes are already searchable)
+        flatten: "searchable" (default) renders to an image with an
+            invisible text layer of the filled values; "raster" is the image
+            alone (pair with ocr); "vector" bakes the field appearances.
+            True means "raster" and False leaves the form editable.
+        encoding: Raster image encoding — rgb, gray, bilevel or jpeg
+        quality: JPEG quality for encoding="jpeg"
+        dpi: Render resolution for raster flattening
+        timings: Optional StageTimings; per-stage timings come back in the result
     
     Returns:
         dict with fill stats
     """
-    doc = fitz.open(form_path)
-    filled = 0
-
-    for widget in doc[0].widgets():
-        fname = widget.field_name
-        if fname in FIELD_MAP:
-            key = FIELD_MAP[fname]
-            value = data.get(key, "")
-            if value:
-                widget.field_value = str(value)
-                widget.update()
-                filled += 1
-
-    # Flatten: render as image, rebuild
-    pix = doc[0].get_pixmap(dpi=200)
-    dst = fitz.open()
-    page = dst.new_page(width=doc[0].rect.width, height=doc[0].rect.height)
-    page.insert_image(doc[0].rect, pixmap=pix)
-    doc.close()
+    timer = timings if timings is not None else NULL_TIMINGS
+    with timer.stage("load"):
+        template = get_template(form_path)
+        doc = template.open()
+
+    with timer.stage("map"):
+        text_values = {fname: str(data[key]) for fname, key in FIELD_MAP.items() if data.get(key)}
+
+    with timer.stage("fill"):
+        filled, _ = fill_fields(doc, template, text_values)
+        text_layer = field_text_layer(template, text_values)  # for searchable mode
+
+    # Flatten: render as image (or bake the fields) and rebuild
+    mode = flatten_mode(flatten)
+    stats = {}
+    with timer.stage("flatten"):
+        if mode:
+            dst = flatten_document(doc, mode=mode, dpi=dpi, pages=[0], encoding=encoding,
+                                   quality=quality, stats=stats, text_layer=text_layer)
+            doc.close()
+        else:
+            dst = doc  # left editable
+            dst.select([0])
 
     # Save flattened
-    if ocr:
-        tmp_path = output_path + ".tmp.pdf"
-        dst.save(tmp_path, deflate=True)
+    if ocr and mode == "raster":
+        with timer.stage("save") as stage:
+            pdf_bytes = dst.tobytes(deflate=True)
+            stage.bytes = len(pdf_bytes)
         dst.close()
-        try:
-            subprocess.run(
-                ["ocrmypdf", "--skip-text", "--optimize", "1", tmp_path, output_path],
-                capture_output=True, text=True, timeout=60
-            )
-            os.remove(tmp_path)
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            # ocrmypdf not available, use unOCR'd version
-            os.rename(tmp_path, output_path)
+        with timer.stage("ocr") as stage:
+            pdf_bytes, ocr_stats = ocr_pdf(pdf_bytes)
+            with open(output_path, "wb") as f:
+                f.write(pdf_bytes)
+            stage.bytes = len(pdf_bytes)
+        stats.update(ocr_stats)
     else:
-        dst.save(output_path, deflate=True)
+        with timer.stage("save") as stage:
+            dst.save(output_path, deflate=True)
+            stage.bytes = os.path.getsize(output_path)
         dst.close()
 
-    return {"fields_filled": filled, "output": output_path}
+    if timings is not None:
+        stats["timings"] = timings.as_dict()
+    return {"fields_filled": filled, "output": output_path,
+            "output_bytes": os.path.getsize(output_path), **stats}
 
 
 def main():
@@ -129,14 +152,29 @@ def main():
     parser.add_argument("--input", required=True, help="JSON data file")
     parser.add_argument("--form", required=True, help="Blank ACORD 37 PDF")
     parser.add_argument("--output", required=True, help="Output PDF path")
-    parser.add_argument("--no-ocr", action="store_true", help="Skip OCR text layer")
+    parser.add_argument("--no-ocr", action="store_true",
+                        help="Skip OCR (only raster output is OCR'd; the other modes "
+                             "are already searchable)")
+    parser.add_argument("--flatten-mode", choices=FLATTEN_MODES, default="searchable",
+                        help="searchable = image + invisible text layer, raster = image only "
+                             "(OCR'd unless --no-ocr), vector = bake field appearances")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="rgb",
+                        help="Raster image encoding (bilevel is smallest)")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY,
+                        help="JPEG quality for --encoding jpeg")
+    parser.add_argument("--timings", action="store_true", help="Print per-stage timings")
     args = parser.parse_args()
 
     with open(args.input) as f:
         data = json.load(f)
 
-    result = fill_acord37(data, args.form, args.output, ocr=not args.no_ocr)
+    result = fill_acord37(data, args.form, args.output, ocr=not args.no_ocr,
+                          flatten=args.flatten_mode, encoding=args.encoding,
+                          quality=args.jpeg_quality,
+                          timings=StageTimings() if args.timings else None)
     print(f"Done: {result['fields_filled']} fields filled -> {result['output']}")
+    if "timings" in result:
+        print(format_timings(result["timings"]))
 
 
 if __name__ == "__main__":
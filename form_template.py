@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Form Template Cache — Load each blank ACORD PDF once, hand out cheap clones.
+
+Opening a blank from disk and walking every widget costs ~200ms on the
+924-field ACORD 125/140 packet, which dominates small-certificate latency.
+A FormTemplate keeps the blank's bytes in memory together with a widget
+index (field name -> page/xref/type/rect), so each request only has to
+parse the in-memory copy.
+
+Usage:
+    from form_template import get_template
+    template = get_template("acord-25-blank.pdf")
+    doc = template.open()          # fresh, independent fitz.Document
+    template.widgets["F[0].P1[0].Form_CompletionDate_A[0]"]
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import fitz  # PyMuPDF
+
+from field_writer import AppearanceWriter, FieldSpec, field_spec
+
+# How many blanks to keep in memory. We ship seven; the server uses three.
+DEFAULT_CACHE_SIZE = 8
+
+
+class FormTemplate:
+    """A blank ACORD PDF loaded into memory with its widget index.
+
+    Attributes:
+        path: Path the blank was loaded from.
+        data: Raw PDF bytes.
+        sha256: Hex digest of `data`, used to detect real content changes.
+        mtime_ns / size: File stat at load time, used as the cheap staleness check.
+        widgets: Dict mapping field_name -> list of
+            {page, xref, type, rect} (page is 0-indexed). ACORD reuses some
+            names across pages (e.g. Form_CompletionDate_A on 125/140), so
+            each name can map to several widgets.
+        specs: Dict mapping widget xref -> FieldSpec for the widgets
+            field_writer can fill without widget.update().
+        widget_count: Total number of widgets in the form.
+        page_count: Number of pages in the form.
+    """
+
+    def __init__(self, path: str, data: bytes, stat: os.stat_result):
+        self.path = path
+        self.data = data
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.widgets: dict[str, list[dict]] = {}
+        self.specs: dict[int, FieldSpec] = {}
+        self.widget_count = 0
+
+        doc = self.open()
+        self.page_count = len(doc)
+        for page_num, page in enumerate(doc):
+            for widget in page.widgets():
+                self.widgets.setdefault(widget.field_name, []).append({
+                    "page": page_num,
+                    "xref": widget.xref,
+                    "type": widget.field_type_string,
+                    "rect": tuple(widget.rect),
+                })
+                spec = field_spec(doc, page, widget)
+                if spec is not None:
+                    self.specs[widget.xref] = spec
+                self.widget_count += 1
+        doc.close()
+
+    @classmethod
+    def load(cls, path: str) -> "FormTemplate":
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        return cls(path, data, stat)
+
+    def open(self) -> fitz.Document:
+        """Return a fresh document parsed from the in-memory blank."""
+        return fitz.open(stream=self.data, filetype="pdf")
+
+    def is_stale(self, stat: os.stat_result) -> bool:
+        return stat.st_mtime_ns != self.mtime_ns or stat.st_size != self.size
+
+
+class TemplateCache:
+    """Thread-safe LRU cache of FormTemplates keyed by absolute path.
+
+    Every lookup stats the file. If mtime or size moved, the file is re-read
+    and re-hashed; the widget index is only rebuilt when the hash differs
+    (a `touch` or re-deploy of identical bytes keeps the cached index).
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._templates: "OrderedDict[str, FormTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> FormTemplate:
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None and not template.is_stale(stat):
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+
+        # Load outside the lock — indexing the 125/140 packet takes a while
+        # and other blanks shouldn't wait on it.
+        with open(key, "rb") as f:
+            data = f.read()
+        unchanged = template is not None and hashlib.sha256(data).hexdigest() == template.sha256
+        if not unchanged:
+            template = FormTemplate(key, data, stat)
+
+        with self._lock:
+            if unchanged:
+                # Same bytes: keep the index and just record the new stat.
+                # Under the lock, since other threads read these in is_stale
+                template.mtime_ns = stat.st_mtime_ns
+                template.size = stat.st_size
+            self.misses += 1
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+        return template
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop one template (or all of them if path is None)."""
+        with self._lock:
+            if path is None:
+                self._templates.clear()
+            else:
+                self._templates.pop(os.path.abspath(path), None)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._templates
+
+
+_cache = TemplateCache()
+
+
+def get_template(path: str) -> FormTemplate:
+    """Fetch a blank from the process-wide template cache."""
+    return _cache.get(path)
+
+
+def preload(paths) -> None:
+    """Load a set of blanks up front (e.g. the server's BLANK_FORMS)."""
+    for path in paths:
+        if os.path.exists(path):
+            _cache.get(path)
+
+
+def is_loaded(path: str) -> bool:
+    """Whether a blank is in the template cache (without loading it)."""
+    return path in _cache
+
+
+def fill_fields(doc: fitz.Document, template: FormTemplate,
+                field_data: dict) -> tuple[int, list[str]]:
+    """Fill a cloned template using its widget index.
+
+    Only the widgets named in `field_data` are touched, so cost grows with
+    the number of supplied fields rather than the size of the form. Text
+    fields and checkboxes are written directly by xref (see field_writer);
+    anything else is loaded and widget.update()d. Field names the form
+    doesn't have are returned as skipped.
+
+    Returns:
+        (filled widget count, list of skipped field names)
+    """
+    filled = 0
+    skipped = []
+    pages = {}  # keep Page objects alive while their widgets are updated
+    writer = AppearanceWriter(doc)
+
+    for name, value in field_data.items():
+        entries = template.widgets.get(name)
+        if not entries:
+            skipped.append(name)
+            continue
+        # Booleans tick/untick checkboxes; everything else is text
+        value = value if isinstance(value, bool) else str(value)
+        for entry in entries:
+            filled += 1
+            spec = template.specs.get(entry["xref"])
+            if spec is not None and writer.write(spec, value):
+                continue
+            page = pages.get(entry["page"])
+            if page is None:
+                page = pages[entry["page"]] = doc[entry["page"]]
+            widget = page.load_widget(entry["xref"])
+            widget.field_value = value
+            widget.update()
+
+    return filled, skipped
+
+
+def field_text_layer(template: FormTemplate, field_data: dict) -> dict:
+    """Text layer entries for pdf_flatten's searchable mode, from the index.
+
+    Every text/combo widget named in field_data with a non-empty value
+    contributes (rect, value) on its page — no widget walk needed.
+
+    Returns:
+        Dict page index -> list of (rect, text)
+    """
+    layer = {}
+    for name, value in field_data.items():
+        if isinstance(value, bool) or not str(value).strip():
+            continue
+        for entry in template.widgets.get(name, ()):
+            if entry["type"] in ("Text", "ComboBox") and not fitz.Rect(entry["rect"]).is_empty:
+                layer.setdefault(entry["page"], []).append((entry["rect"], str(value)))
+    return layer
@@ -131,6 +131,23 @@ def map_to_acord25(policy_data: dict, cert_holder: dict, agency: dict) -> dict:
         fields[f"{p}WorkersCompensation_DiseasePolicyLimit_LimitAmount_A[0]"] = wc.get("el_disease_policy", "")
         fields[f"{p}WorkersCompensation_DiseaseEachEmployee_LimitAmount_A[0]"] = wc.get("el_disease_each", "")
     
+    fields.update(map_cert_holder_acord25(policy_data, cert_holder))
+    return fields
+
+
+def map_cert_holder_acord25(policy_data: dict, cert_holder: dict) -> dict:
+    """Map the holder-specific ACORD 25 fields: holder block, remarks and AI codes.
+
+    Everything else on the certificate depends only on the policy and agency,
+    so a bulk run can map `map_to_acord25(policy_data, {}, agency)` once and
+    merge this on top for each holder.
+    """
+    fields = {}
+    cov = policy_data.get("coverages", {})
+    gl = cov.get("gl", {})
+    auto = cov.get("auto", {})
+    p = "F[0].P1[0]."
+    
     # Certificate Holder
     ch = cert_holder
     fields[f"{p}CertificateHolder_FullName_A[0]"] = ch.get("name", "")
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+OCR Service — Shared pool of long-lived ocrmypdf workers.
+
+Raster-flattened output is image-only; when it does need real OCR, the
+fillers and the server hand the PDF bytes to this module instead of each
+spawning an `ocrmypdf` process of its own. Workers import ocrmypdf once and
+stay up, every document is OCR'd with `jobs` pages in parallel, and at most
+OCR_WORKERS documents are in flight — later callers wait for a slot, and
+that wait is reported separately from the OCR time.
+
+ACORD_OCR_TIMEOUT bounds every stage: the wait for a slot, each Tesseract
+page (ocrmypdf's tesseract_timeout), and the document as a whole. A
+document that overruns retires the worker pool it ran on, so its slot is
+free again at once and later documents start on fresh workers.
+
+Settings (environment):
+    ACORD_OCR_WORKERS  documents OCR'd at once (default 1)
+    ACORD_OCR_JOBS     pages OCR'd in parallel per document (default: CPU count)
+    ACORD_OCR_TIMEOUT  seconds allowed for the slot wait, each page and the
+                       document (default 60)
+
+Usage:
+    from ocr_service import ocr_pdf
+    pdf_bytes, stats = ocr_pdf(pdf_bytes)
+    stats  # {"ocr_applied": True, "ocr_error": None, "ocr_queue_ms": 0.1, "ocr_ms": 2140.3}
+"""
+
+import asyncio
+import functools
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+OCR_WORKERS = int(os.getenv("ACORD_OCR_WORKERS", "1"))
+OCR_JOBS = int(os.getenv("ACORD_OCR_JOBS", str(os.cpu_count() or 1)))
+OCR_TIMEOUT = float(os.getenv("ACORD_OCR_TIMEOUT", "60"))
+
+
+# ── Worker side ──
+
+def _init_worker() -> None:
+    # Pay for the import (and ocrmypdf's plugin discovery) once per worker
+    try:
+        import ocrmypdf  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _ocr_worker(pdf_bytes: bytes, jobs: int, timeout: float) -> tuple[bytes, float]:
+    """OCR one in-memory PDF. Returns (pdf_bytes, seconds spent in ocrmypdf).
+
+    `timeout` caps each Tesseract page; a page that overruns is left
+    without a text layer rather than holding the worker.
+    """
+    import ocrmypdf
+
+    start = time.perf_counter()
+    out = io.BytesIO()
+    # use_threads: ocrmypdf drives Tesseract as subprocesses from threads,
+    # so pages still run in parallel without a process pool inside a worker
+    ocrmypdf.ocr(io.BytesIO(pdf_bytes), out, jobs=jobs, use_threads=True,
+                 skip_text=True, optimize=1, output_type="pdf", progress_bar=False,
+                 tesseract_timeout=timeout)
+    return out.getvalue(), time.perf_counter() - start
+
+
+# ── Caller side ──
+
+class OCRPool:
+    """Bounded pool of OCR worker processes with queue-wait accounting.
+
+    Safe to share between threads. The pool starts on first use and is
+    rebuilt if a worker dies or a document times out.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, jobs: int = OCR_JOBS,
+                 timeout: float = OCR_TIMEOUT):
+        self.workers = max(1, workers)
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._waiting = self._running = 0
+        self._completed = self._failed = 0
+        self._queue_ms = self._ocr_ms = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def _release(self, job: dict, _future=None) -> None:
+        # Called on timeout and again when the worker finishes; only the
+        # first call frees the slot
+        with self._lock:
+            if job["released"]:
+                return
+            job["released"] = True
+            self._running -= 1
+        self._slots.release()
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        """Stop handing work to `executor`; its workers exit once idle."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def ocr(self, pdf_bytes: bytes) -> tuple[bytes, dict]:
+        """OCR a PDF, waiting for a free worker if all are busy.
+
+        Never raises for OCR problems: if ocrmypdf is missing, fails or times
+        out, the input comes back unchanged with ocr_applied False and the
+        reason in ocr_error.
+
+        Returns:
+            (pdf_bytes, stats) — stats has ocr_applied, ocr_error,
+            ocr_queue_ms and ocr_ms
+        """
+        stats = {"ocr_applied": False, "ocr_error": None, "ocr_queue_ms": 0.0, "ocr_ms": 0.0}
+        if not ocr_available():
+            stats["ocr_error"] = "ocrmypdf is not installed"
+            return pdf_bytes, stats
+
+        with self._lock:
+            self._waiting += 1
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        queue_wait = time.perf_counter() - start
+        with self._lock:
+            self._waiting -= 1
+            self._queue_ms += queue_wait * 1000
+            if acquired:
+                self._running += 1
+            else:
+                self._failed += 1
+        stats["ocr_queue_ms"] = round(queue_wait * 1000, 1)
+        if not acquired:
+            stats["ocr_error"] = f"no OCR worker free after {self.timeout:g}s"
+            return pdf_bytes, stats
+
+        release = functools.partial(self._release, {"released": False})
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_ocr_worker, pdf_bytes, self.jobs, self.timeout)
+        except Exception:
+            release()
+            raise
+        future.add_done_callback(release)
+
+        try:
+            out, ocr_time = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            stats["ocr_error"] = f"OCR timed out after {self.timeout:g}s"
+            # Later documents go to fresh workers; the overrunning one is
+            # bounded by tesseract_timeout and exits when it finishes
+            self._retire(executor)
+            release()
+        except BrokenProcessPool as e:
+            stats["ocr_error"] = f"OCR worker died ({e})"
+            self._retire(executor)
+        except Exception as e:
+            stats["ocr_error"] = f"{type(e).__name__}: {e}"
+        else:
+            pdf_bytes = out
+            stats["ocr_applied"] = True
+            stats["ocr_ms"] = round(ocr_time * 1000, 1)
+
+        with self._lock:
+            if stats["ocr_applied"]:
+                self._completed += 1
+                self._ocr_ms += ocr_time * 1000
+            else:
+                self._failed += 1
+        return pdf_bytes, stats
+
+    def stats(self) -> dict:
+        """Pool counters, for the dashboard."""
+        with self._lock:
+            done = self._completed + self._failed
+            return {
+                "workers": self.workers, "jobs": self.jobs,
+                "running": self._running, "waiting": self._waiting,
+                "completed": self._completed, "failed": self._failed,
+                "avg_queue_ms": round(self._queue_ms / done, 1) if done else 0.0,
+                "avg_ocr_ms": round(self._ocr_ms / self._completed, 1) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            self._retire(executor)
+
+
+_available: Optional[bool] = None
+
+
+def ocr_available() -> bool:
+    """Whether the ocrmypdf Python package can be imported here."""
+    global _available
+    if _available is None:
+        try:
+            import ocrmypdf  # noqa: F401
+            _available = True
+        except ImportError:
+            _available = False
+    return _available
+
+
+_pool: Optional[OCRPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> OCRPool:
+    """The process-wide OCR pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRPool()
+        return _pool
+
+
+def ocr_pdf(pdf_bytes: bytes) -> tuple[bytes, dict]:
+    """OCR a PDF through the shared pool. See OCRPool.ocr."""
+    return get_ocr_pool().ocr(pdf_bytes)
+
+
+async def ocr_pdf_async(pdf_bytes: bytes) -> tuple[bytes, dict]:
+    """ocr_pdf for async callers — the slot wait happens off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, ocr_pdf, pdf_bytes)
+
+
+def ocr_file(path: str) -> dict:
+    """OCR a PDF on disk in place. Returns the ocr_pdf stats."""
+    with open(path, "rb") as f:
+        pdf_bytes, stats = ocr_pdf(f.read())
+    if stats["ocr_applied"]:
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+    return stats
+
+
+def shutdown() -> None:
+    if _pool is not None:
+        _pool.shutdown()
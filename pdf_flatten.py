@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+PDF Flattening — Turn a filled ACORD form into a non-editable PDF.
+
+Three modes:
+    raster      Render every page to a pixmap and rebuild an image-only PDF.
+                What we've always shipped. Slow, large, needs OCR to be searchable.
+    searchable  raster, plus an invisible text layer (render mode 3) written
+                from the filled field values at their widget rects. Searchable
+                and copyable without OCR.
+    vector      Bake each widget's appearance stream into the page content and
+                drop the AcroForm. Pixel-identical on screen, no fields left to
+                edit, a fraction of the CPU and bytes, and the text stays real text.
+
+Raster pages can be stored with one of several image encodings:
+    rgb      Full-color, Flate-compressed. The historical output.
+    gray     8-bit grayscale, Flate. A third of the samples of rgb.
+    bilevel  1-bit black/white (thresholded), Flate. ACORD forms are black
+             ink on white paper, so this is usually the smallest.
+    jpeg     DCT-compressed RGB at `quality`. Small, but blurs thin rules.
+
+Usage:
+    from pdf_flatten import flatten_document
+    dst = flatten_document(doc, mode="vector")
+    dst.save("out.pdf", deflate=True)
+    dst = flatten_document(doc, mode="raster", encoding="bilevel")
+"""
+
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+
+import fitz  # PyMuPDF
+
+FLATTEN_MODES = ("raster", "vector", "searchable")
+RASTER_MODES = ("raster", "searchable")
+ENCODINGS = ("rgb", "gray", "bilevel", "jpeg")
+
+# Gray level (0-255) at or above which a bilevel pixel is white
+BILEVEL_THRESHOLD = 160
+DEFAULT_JPEG_QUALITY = 75
+
+# Text layer: never larger than this, and scaled down to fit the widget width
+TEXT_LAYER_MAX_FONTSIZE = 10
+
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def flatten_mode(flatten: Union[bool, str, None]) -> Optional[str]:
+    """Normalize a `flatten` argument to a mode name (or None for editable).
+
+    Accepts the historical booleans (True means raster) as well as a mode name.
+    """
+    if flatten is True:
+        return "raster"
+    if not flatten:
+        return None
+    if flatten not in FLATTEN_MODES:
+        raise ValueError(f"Unknown flatten mode: {flatten!r} (expected one of {FLATTEN_MODES})")
+    return flatten
+
+
+def _bilevel_bits(pix: fitz.Pixmap, threshold: int = BILEVEL_THRESHOLD) -> bytes:
+    """Threshold a grayscale pixmap and pack it 1 bit per pixel (1 = white).
+
+    Each sample is mapped to an ASCII '0'/'1' with bytes.translate, every row
+    is padded to a byte boundary, and the whole bit string goes through
+    int(..., 2) — all C loops, ~7ms for a 200dpi letter page.
+    """
+    table = bytes(0x31 if level >= threshold else 0x30 for level in range(256))
+    digits = pix.samples.translate(table)
+    width, height = pix.width, pix.height
+    pad = b"1" * (-width % 8)
+    if pad:
+        digits = b"".join(digits[row:row + width] + pad for row in range(0, width * height, width))
+    stride = (width + 7) // 8
+    return int(digits, 2).to_bytes(stride * height, "big")
+
+
+def insert_page_image(dst: fitz.Document, rect: fitz.Rect, pix: fitz.Pixmap,
+                      encoding: str = "rgb", quality: int = DEFAULT_JPEG_QUALITY) -> None:
+    """Append a page of size `rect` to dst showing `pix` in the given encoding."""
+    page = dst.new_page(width=rect.width, height=rect.height)
+    if encoding == "rgb":
+        page.insert_image(rect, pixmap=pix)
+    elif encoding == "gray":
+        page.insert_image(rect, pixmap=fitz.Pixmap(fitz.csGRAY, pix))
+    elif encoding == "jpeg":
+        page.insert_image(rect, stream=pix.tobytes("jpg", jpg_quality=quality))
+    elif encoding == "bilevel":
+        # MuPDF has no 1-bit pixmaps, so write the image XObject ourselves
+        bits = _bilevel_bits(fitz.Pixmap(fitz.csGRAY, pix))
+        xref = dst.get_new_xref()
+        dst.update_object(xref, f"<< /Type /XObject /Subtype /Image /Width {pix.width} "
+                                f"/Height {pix.height} /ColorSpace /DeviceGray /BitsPerComponent 1 >>")
+        dst.update_stream(xref, bits, compress=True)
+        page.insert_image(rect, xref=xref)
+    else:
+        raise ValueError(f"Unknown encoding: {encoding!r} (expected one of {ENCODINGS})")
+
+
+def widget_text_layer(doc: fitz.Document, pages: Optional[list[int]] = None) -> dict:
+    """Text layer entries read back from a filled document's widgets.
+
+    Walks every widget, so it's slow on big forms — callers that know what
+    they filled should use form_template.field_text_layer() instead.
+
+    Returns:
+        Dict page index -> list of (rect, text)
+    """
+    layer = {}
+    for i in (range(len(doc)) if pages is None else pages):
+        for widget in doc[i].widgets():
+            if widget.field_type in (fitz.PDF_WIDGET_TYPE_TEXT, fitz.PDF_WIDGET_TYPE_COMBOBOX) \
+                    and widget.field_value and not widget.rect.is_empty:
+                layer.setdefault(i, []).append((widget.rect, str(widget.field_value)))
+    return layer
+
+
+def add_text_layer(page: fitz.Page, entries) -> None:
+    """Write (rect, text) entries onto page as invisible text (render mode 3).
+
+    Each line gets a font size that fits the widget's height and width, so
+    search hits and copy/paste selections land on the visible value.
+    """
+    if not entries:
+        return
+    font = fitz.Font("helv")
+    writer = fitz.TextWriter(page.rect)
+    for rect, text in entries:
+        rect = fitz.Rect(rect)
+        lines = text.splitlines() or [text]
+        line_height = rect.height / len(lines)
+        for k, line in enumerate(lines):
+            if not line.strip():
+                continue
+            fontsize = min(line_height * 0.8, TEXT_LAYER_MAX_FONTSIZE)
+            width = font.text_length(line, fontsize=fontsize)
+            if width > rect.width - 2:
+                fontsize *= (rect.width - 2) / width
+            baseline = rect.y0 + line_height * k + (line_height + fontsize * 0.7) / 2
+            writer.append((rect.x0 + 1, baseline), line, font=font, fontsize=fontsize)
+    writer.write_text(page, render_mode=3)
+
+
+def _render_pages(pdf_bytes: bytes, pages: list[int], dpi: int) -> list[tuple]:
+    """Pool worker: render a run of pages from the filled PDF's bytes.
+
+    Returns raw RGB samples rather than PNGs — encoding here only to decode
+    again in the parent would eat most of the parallel speedup.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    out = []
+    for i in pages:
+        pix = doc[i].get_pixmap(dpi=dpi)
+        out.append((pix.width, pix.height, pix.samples))
+    doc.close()
+    return out
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """One long-lived pool per worker count; process spawn would eat small jobs.
+
+    Pools are never shut down here: another thread may still be mapping
+    over one, and callers only ever use a handful of worker counts.
+    """
+    with _pool_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def _chunk(items: list, n: int) -> list[list]:
+    """Split items into n contiguous, near-equal runs (empty runs dropped)."""
+    size, extra = divmod(len(items), n)
+    runs, start = [], 0
+    for k in range(n):
+        end = start + size + (1 if k < extra else 0)
+        if end > start:
+            runs.append(items[start:end])
+        start = end
+    return runs
+
+
+def rasterize(doc: fitz.Document, dpi: int = 200, pages: Optional[list[int]] = None,
+              workers: int = 1, encoding: str = "rgb", quality: int = DEFAULT_JPEG_QUALITY,
+              stats: Optional[dict] = None, text_layer: Optional[dict] = None) -> fitz.Document:
+    """Render pages to images and rebuild them as a new image-only document.
+
+    With workers > 1 the pages are split into contiguous ranges and rendered
+    in a process pool; each worker opens the filled document from the same
+    serialized bytes and the parent inserts the images back in page order.
+
+    If `stats` is given, time spent encoding/inserting the page images is
+    added to stats["encode_ms"]. `text_layer` (page index -> [(rect, text)])
+    is written over each page image as invisible text.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding!r} (expected one of {ENCODINGS})")
+    pages = list(range(len(doc))) if pages is None else list(pages)
+    dst = fitz.open()
+    encode_time = 0.0
+
+    def _insert(i, rect, pix):
+        nonlocal encode_time
+        start = time.perf_counter()
+        insert_page_image(dst, rect, pix, encoding, quality)
+        encode_time += time.perf_counter() - start
+        if text_layer:
+            add_text_layer(dst[-1], text_layer.get(i))
+
+    if workers <= 1 or len(pages) < 2:
+        for i in pages:
+            page = doc[i]
+            _insert(i, page.rect, page.get_pixmap(dpi=dpi))
+    else:
+        _rasterize_parallel(doc, pages, dpi, workers, _insert)
+
+    if stats is not None:
+        stats["encode_ms"] = stats.get("encode_ms", 0.0) + round(encode_time * 1000, 1)
+    return dst
+
+
+def _rasterize_parallel(doc: fitz.Document, pages: list[int], dpi: int, workers: int,
+                        insert) -> None:
+    """Render page runs in the pool, then insert(i, rect, pixmap) them in page order."""
+    pdf_bytes = doc.tobytes()
+    runs = _chunk(pages, min(workers, len(pages)))
+    pool = _get_pool(workers)
+    rendered = pool.map(_render_pages, [pdf_bytes] * len(runs), runs, [dpi] * len(runs))
+
+    for run, images in zip(runs, rendered):
+        for i, (width, height, samples) in zip(run, images):
+            insert(i, doc[i].rect, fitz.Pixmap(fitz.csRGB, width, height, samples, 0))
+
+
+def bake(doc: fitz.Document, pages: Optional[list[int]] = None) -> fitz.Document:
+    """Merge widget/annotation appearances into page content.
+
+    Bakes `doc` in place (its fields are gone afterwards) and copies the
+    selected pages into a new document, so callers close both just like
+    they do after rasterize().
+    """
+    doc.bake(annots=True, widgets=True)
+    dst = fitz.open()
+    if pages is None:
+        dst.insert_pdf(doc)
+    else:
+        for i in pages:
+            dst.insert_pdf(doc, from_page=i, to_page=i)
+    return dst
+
+
+def flatten_document(doc: fitz.Document, mode: str = "raster", dpi: int = 200,
+                     pages: Optional[list[int]] = None, workers: int = 1,
+                     encoding: str = "rgb", quality: int = DEFAULT_JPEG_QUALITY,
+                     stats: Optional[dict] = None,
+                     text_layer: Optional[dict] = None) -> fitz.Document:
+    """Flatten a filled document into a new, non-editable document.
+
+    Args:
+        doc: Filled form document.
+        mode: "raster", "searchable" or "vector".
+        dpi: Render resolution (raster mode only).
+        pages: 0-indexed pages to keep, in order. Default: all.
+        workers: Processes to rasterize with (raster mode only).
+        encoding: Page image encoding, one of ENCODINGS (raster mode only).
+        quality: JPEG quality 1-100 (encoding="jpeg" only).
+        stats: Optional dict; raster mode adds its image encode time as encode_ms.
+        text_layer: Searchable mode only — page index -> [(rect, text)] to
+            write as invisible text. Default: read back from the widgets.
+    """
+    if mode == "vector":
+        return bake(doc, pages=pages)
+    if mode == "searchable" and text_layer is None:
+        text_layer = widget_text_layer(doc, pages)
+    if mode in RASTER_MODES:
+        return rasterize(doc, dpi=dpi, pages=pages, workers=workers, encoding=encoding,
+                         quality=quality, stats=stats,
+                         text_layer=text_layer if mode == "searchable" else None)
+    raise ValueError(f"Unknown flatten mode: {mode!r} (expected one of {FLATTEN_MODES})")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Render Pool — Process pool for the server's PDF work, off the event loop.
+
+PyMuPDF is CPU-bound and not thread-safe, so fills, flattening and
+signature stamping run in worker processes and the request handlers just
+await them. Workers are recycled after about `max_tasks_per_child` jobs
+each, which caps how far MuPDF's allocator can grow a long-lived worker.
+The pool counts jobs in flight so queue depth and queue wait can be
+reported.
+
+Settings (environment):
+    ACORD_RENDER_WORKERS     worker processes (default: CPU count)
+    ACORD_RENDER_MAX_TASKS   jobs per worker before it is replaced (default 200, 0 = never)
+
+Usage:
+    from render_pool import get_render_pool
+    pdf_bytes, stats = await get_render_pool().run(render_certificate, blank, fields)
+    get_render_pool().stats()  # {"workers": 4, "in_flight": 6, "queued": 2, ...}
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+RENDER_WORKERS = int(os.getenv("ACORD_RENDER_WORKERS", str(os.cpu_count() or 2)))
+RENDER_MAX_TASKS = int(os.getenv("ACORD_RENDER_MAX_TASKS", "200"))
+
+# After a worker dies, report unhealthy until a job succeeds or this many
+# seconds pass — an instance taken out of rotation gets no jobs to prove itself
+BROKEN_GRACE = 30.0
+
+
+def _run_job(fn, submitted: float, args: tuple):
+    """Worker side: run one job and report how long it sat in the queue."""
+    waited = time.time() - submitted
+    return fn(*args), waited
+
+
+class RenderPool:
+    """ProcessPoolExecutor with worker recycling and queue accounting.
+
+    Recycling retires the whole executor once it has been handed
+    workers * max_tasks_per_child jobs: queued jobs still finish on the old
+    workers while new ones go to a fresh set. (ProcessPoolExecutor's own
+    max_tasks_per_child can deadlock before Python 3.12.)
+
+    Attributes:
+        workers: Worker processes.
+        max_tasks_per_child: Jobs per worker before it is replaced (None = never).
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS,
+                 max_tasks_per_child: Optional[int] = RENDER_MAX_TASKS or None):
+        self.workers = max(1, workers)
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._submitted = 0  # jobs handed to the current executor
+        self._recycled = 0
+        self._completed = self._failed = 0
+        self._queue_ms = 0.0
+        self._max_queued = 0
+        self._broken_at: Optional[float] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if (self._executor is not None and self.max_tasks_per_child
+                    and self._submitted >= self.workers * self.max_tasks_per_child):
+                # Doesn't cancel anything: the old workers exit once their queue drains
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                self._recycled += 1
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._submitted = 0
+            self._submitted += 1
+            return self._executor
+
+    async def run(self, fn, *args, timings=None):
+        """Run fn(*args) in a worker and return its result.
+
+        fn and args must be picklable (module-level functions, plain data).
+        With a StageTimings as `timings`, the time the job waited for a
+        worker is recorded as a "queue" stage.
+        """
+        with self._lock:
+            self._in_flight += 1
+            self._max_queued = max(self._max_queued, self._in_flight - self.workers)
+        try:
+            executor = self._get_executor()
+            result, waited = await asyncio.get_running_loop().run_in_executor(
+                executor, _run_job, fn, time.time(), args)
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault); start a fresh pool for the next job
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                self._failed += 1
+                self._broken_at = time.monotonic()
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        waited = max(waited, 0.0)
+        with self._lock:
+            self._completed += 1
+            self._queue_ms += waited * 1000
+            self._broken_at = None
+        if timings is not None:
+            timings.add("queue", waited, 0.0)
+        return result
+
+    def healthy(self) -> bool:
+        """Whether the pool can take work, without queueing a job.
+
+        False from the moment a job fails with BrokenProcessPool (a worker
+        died) until a later job succeeds, or BROKEN_GRACE seconds pass.
+        The broken executor is already dropped by then, so the next job
+        starts a fresh one.
+        """
+        with self._lock:
+            return self._broken_at is None or time.monotonic() - self._broken_at >= BROKEN_GRACE
+
+    def stats(self) -> dict:
+        """Pool counters, for the dashboard."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_tasks_per_child": self.max_tasks_per_child,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.workers),
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "recycled": self._recycled,
+                "avg_queue_ms": round(self._queue_ms / self._completed, 1) if self._completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[RenderPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    """The process-wide render pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool()
+        return _pool
+
+
+def shutdown() -> None:
+    if _pool is not None:
+        _pool.shutdown()
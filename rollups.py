@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Rollups — Incremental hourly/daily/all-time aggregates of server telemetry.
+
+The dashboard used to COUNT(*) and scan the telemetry tables on every call
+(and json.loads every generation's coverages), so it got slower as history
+grew. Instead, AFTER INSERT triggers on requests/extractions/generations/
+errors upsert counters into one `rollups` table, keyed by
+(period, bucket, metric, key):
+
+    period  "hour" (bucket "YYYY-MM-DD HH:00"), "day" ("YYYY-MM-DD") or "all" ("")
+    metric  requests, extractions, generations, errors, error_type, form_type,
+            coverage, extract_ms, generate_ms
+    key     the error type / form type / coverage, else ""
+
+Each row has a count, a total (for the *_ms averages) and last_seen. The
+triggers live in the database, so rows written by any connection are
+counted. Existing history is backfilled once, when the table is created.
+
+Usage:
+    from rollups import init_rollups, rollup_summary
+    init_rollups(conn)                 # at startup, after the base tables exist
+    summary = rollup_summary(conn)     # dashboard aggregates, a few indexed lookups
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+# (table, metric, key, total, condition, source). {r} is the row (NEW in the
+# triggers, the table alias in the backfill); source adds a table-valued
+# function to fan a row out (one coverage row per entry in the JSON list).
+# key and total must never be NULL: a constraint failure in a trigger would
+# abort the telemetry INSERT that fired it.
+METRICS = [
+    ("requests", "requests", "''", "0", "1", ""),
+    ("requests", "generate_ms", "''", "COALESCE({r}.duration_ms, 0)",
+     "{r}.endpoint = '/api/generate' AND {r}.status_code = 200 AND {r}.duration_ms IS NOT NULL", ""),
+    ("extractions", "extractions", "''", "0", "1", ""),
+    ("extractions", "extract_ms", "''", "COALESCE({r}.ai_duration_ms, 0)", "{r}.ai_duration_ms > 0", ""),
+    ("generations", "generations", "''", "0", "1", ""),
+    ("generations", "form_type", "COALESCE({r}.form_type, '')", "0", "1", ""),
+    ("generations", "coverage", "cov.value", "0", "cov.value IS NOT NULL",
+     "json_each(CASE WHEN json_valid({r}.coverages) THEN {r}.coverages ELSE '[]' END) AS cov"),
+    ("errors", "errors", "''", "0", "1", ""),
+    ("errors", "error_type", "COALESCE({r}.error_type, '')", "0", "1", ""),
+]
+
+PERIODS = {
+    "hour": "strftime('%Y-%m-%d %H:00', {r}.timestamp)",
+    "day": "substr({r}.timestamp, 1, 10)",
+    "all": "''",
+}
+
+ROLLUP_TABLE = """
+    CREATE TABLE rollups (
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        key TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        total REAL NOT NULL DEFAULT 0,
+        last_seen TEXT,
+        PRIMARY KEY (period, metric, bucket, key)
+    )
+"""
+
+_UPSERT = """
+    INSERT INTO rollups (period, bucket, metric, key, count, total, last_seen)
+    {select}
+    ON CONFLICT (period, metric, bucket, key) DO UPDATE SET
+        count = count + excluded.count,
+        total = total + excluded.total,
+        last_seen = max(COALESCE(last_seen, ''), excluded.last_seen)
+"""
+
+
+def _trigger_sql(table: str) -> str:
+    statements = []
+    for t, metric, key, total, cond, source in METRICS:
+        if t != table:
+            continue
+        for period, bucket in PERIODS.items():
+            fmt = {"r": "NEW"}
+            select = (f"SELECT '{period}', {bucket.format(**fmt)}, '{metric}', {key.format(**fmt)}, "
+                      f"1, {total.format(**fmt)}, NEW.timestamp"
+                      + (f" FROM {source.format(**fmt)}" if source else "")
+                      + f" WHERE {cond.format(**fmt)}")
+            statements.append(_UPSERT.format(select=select).strip() + ";")
+    body = "\n        ".join(statements)
+    return f"CREATE TRIGGER rollup_{table} AFTER INSERT ON {table} BEGIN\n        {body}\n    END;"
+
+
+def _backfill(conn: sqlite3.Connection) -> None:
+    for table, metric, key, total, cond, source in METRICS:
+        fmt = {"r": "r"}
+        for period, bucket in PERIODS.items():
+            conn.execute(
+                f"INSERT INTO rollups (period, bucket, metric, key, count, total, last_seen) "
+                f"SELECT '{period}', {bucket.format(**fmt)} AS b, '{metric}', {key.format(**fmt)} AS k, "
+                f"COUNT(*), COALESCE(SUM({total.format(**fmt)}), 0), MAX(r.timestamp) "
+                f"FROM {table} AS r" + (f", {source.format(**fmt)}" if source else "")
+                + f" WHERE {cond.format(**fmt)} GROUP BY b, k")
+
+
+def init_rollups(conn: sqlite3.Connection) -> None:
+    """Create the rollups table and triggers; backfill history on first run."""
+    # BEGIN IMMEDIATE takes the write lock, so two server processes starting
+    # together can't both backfill
+    conn.execute("BEGIN IMMEDIATE")
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'").fetchone()
+    if not exists:
+        # Same transaction as the triggers, so nothing is counted twice
+        conn.execute(ROLLUP_TABLE)
+        _backfill(conn)
+    for table in sorted({m[0] for m in METRICS}):
+        # Recreated every start, so a changed METRICS spec reaches existing databases
+        conn.execute(f"DROP TRIGGER IF EXISTS rollup_{table}")
+        conn.execute(_trigger_sql(table))
+    conn.commit()
+
+
+def rollup_totals(conn: sqlite3.Connection) -> dict[str, int]:
+    """All-time row counts per metric (requests, extractions, generations, errors, ...)."""
+    return dict(conn.execute(
+        "SELECT metric, count FROM rollups WHERE period = 'all' AND bucket = '' AND key = ''").fetchall())
+
+
+def rollup_summary(conn: sqlite3.Connection, now: datetime = None) -> dict:
+    """The dashboard's aggregate numbers, read from the rollups."""
+    now = now or datetime.now(timezone.utc)
+    today = now.strftime("%Y-%m-%d")
+
+    def counts(period: str, bucket: str) -> dict:
+        rows = conn.execute(
+            "SELECT metric, count, total FROM rollups WHERE period = ? AND bucket = ? AND key = ''",
+            (period, bucket)).fetchall()
+        return {r[0]: (r[1], r[2]) for r in rows}
+
+    def by_key(metric: str, order: str = "count DESC", limit: int = -1) -> list:
+        return conn.execute(
+            f"SELECT key, count, last_seen FROM rollups WHERE period = 'all' AND bucket = '' "
+            f"AND metric = ? ORDER BY {order} LIMIT ?", (metric, limit)).fetchall()
+
+    tables = ["requests", "extractions", "generations", "errors"]
+    totals, today_counts = counts("all", ""), counts("day", today)
+    stats = {}
+    for table in tables:
+        stats[f"total_{table}"] = totals.get(table, (0, 0))[0]
+    for table in tables:
+        stats[f"today_{table}"] = today_counts.get(table, (0, 0))[0]
+
+    since = (now - timedelta(hours=24)).strftime("%Y-%m-%d %H:00")
+    hourly = [{"hour": r[0], "count": r[1]} for r in conn.execute(
+        "SELECT bucket, count FROM rollups WHERE period = 'hour' AND metric = 'requests' "
+        "AND key = '' AND bucket > ? ORDER BY bucket", (since,)).fetchall()]
+
+    def avg(metric: str) -> float:
+        count, total = totals.get(metric, (0, 0))
+        return round(total / count, 1) if count else 0
+
+    return {
+        "stats": stats,
+        "hourly_activity": hourly,
+        # NULL types are keyed as '' in the rollups; report them as null, as before
+        "top_errors": [{"error_type": r[0] or None, "count": r[1], "last_seen": r[2]}
+                       for r in by_key("error_type", limit=10)],
+        "form_distribution": [{"form_type": r[0] or None, "count": r[1]}
+                              for r in by_key("form_type", order="key")],
+        "coverage_frequency": {r[0]: r[1] for r in by_key("coverage")},
+        "avg_extraction_ms": avg("extract_ms"),
+        "avg_generation_ms": avg("generate_ms"),
+    }
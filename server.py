@@ -5,23 +5,40 @@ Every request, every file, every error — captured for training data.
 """
 
 import os
+import io
 import json
 import uuid
-import base64
-import tempfile
+import copy
+import asyncio
+import zipfile
 import time
 import traceback
 import hashlib
 import sqlite3
+import tempfile
 from datetime import datetime, timezone
 from typing import Optional
 from contextlib import contextmanager
+from functools import lru_cache
 
-import fitz  # PyMuPDF
 from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
-import httpx
+from fastapi.responses import Response, JSONResponse, StreamingResponse, FileResponse
+
+from ai_client import (aclose as close_ai_client, client_info as ai_client_info, latency_stats,
+                       post_hedged)
+from ai_fallback import fallback_stats, report_fallback_key, resolve_fallback_key, run_cli_fallback
+from artifact_store import FOLDERS as ARTIFACT_FOLDERS, ArtifactStore, import_flat_dirs, init_artifacts
+from certificates import (extract_text_from_pdf, merge_pdfs, pdf_page_count, pdf_pages_to_images,
+                          render_certificate, render_composited)
+from form_template import is_loaded as template_loaded, preload as preload_templates
+from map_acord25 import map_cert_holder_acord25
+from ocr_service import get_ocr_pool, ocr_pdf_async, shutdown as shutdown_ocr
+from pdf_flatten import FLATTEN_MODES, RASTER_MODES
+from render_pool import get_render_pool, shutdown as shutdown_render
+from rollups import init_rollups, rollup_summary, rollup_totals
+from stage_timings import StageTimings
+from telemetry_db import ReaderPool, TelemetryWriter, enable_wal
 
 app = FastAPI(title="ACORD Certificate Generator API v2")
 
@@ -35,19 +52,42 @@ app.add_middleware(
 
 API_KEY = os.getenv("ACORD_API_KEY", "acord-demo-2026")
 ANTHROPIC_KEY = os.getenv("ANTHROPIC_API_KEY", "")
+AI_MODEL = "claude-sonnet-4-20250514"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(DATA_DIR, "telemetry.db")
+ARTIFACT_DIR = os.path.join(DATA_DIR, "artifacts")
 BLANK_FORMS = {
     "25": os.path.join(BASE_DIR, "acord-25-blank.pdf"),
     "24": os.path.join(BASE_DIR, "acord-24-blank.pdf"),
     "28": os.path.join(BASE_DIR, "acord-28-blank.pdf"),
 }
 
-os.makedirs(os.path.join(DATA_DIR, "uploads"), exist_ok=True)
-os.makedirs(os.path.join(DATA_DIR, "generated"), exist_ok=True)
-os.makedirs(os.path.join(DATA_DIR, "errors"), exist_ok=True)
-os.makedirs(os.path.join(DATA_DIR, "extractions"), exist_ok=True)
+MAX_BULK_HOLDERS = 500
+
+# /api/extract uploads are streamed to disk in chunks and checked before they
+# are kept, so concurrent uploads don't each hold a whole file in memory
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_UPLOAD_PAGES = 200
+UPLOAD_CHUNK = 1024 * 1024
+
+# Extraction results are reused for a re-uploaded document (same SHA-256,
+# same model and prompt) for this long; 0 turns the cache off
+EXTRACT_CACHE_TTL = int(os.getenv("ACORD_EXTRACT_CACHE_TTL", str(7 * 24 * 3600)))
+
+# /api/dashboard reuses its DB results for this many seconds
+DASHBOARD_TTL = float(os.getenv("ACORD_DASHBOARD_TTL", "5"))
+
+# Seconds each /ready check may take before it counts as failed
+READY_TIMEOUT = float(os.getenv("ACORD_READY_TIMEOUT", "5"))
+
+# /api/dashboard/files pages are at most this long
+MAX_FILES_PAGE = 500
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Parse each blank once per worker; /api/generate clones it from memory
+preload_templates(BLANK_FORMS.values())
 
 
 # ── Database ──
@@ -91,7 +131,8 @@ def init_db():
             insured_name TEXT,
             carrier TEXT,
             coverages_found TEXT,
-            error TEXT
+            error TEXT,
+            cache_hit INTEGER DEFAULT 0
         );
         
         CREATE TABLE IF NOT EXISTS generations (
@@ -120,6 +161,31 @@ def init_db():
             agency_data TEXT,
             flatten INTEGER DEFAULT 1,
             user_id TEXT,
+            error TEXT,
+            timings TEXT
+        );
+        
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            upload_sha256 TEXT NOT NULL,
+            version TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            extraction_id TEXT,
+            extracted_data TEXT NOT NULL,
+            meta TEXT,
+            hits INTEGER DEFAULT 0,
+            PRIMARY KEY (upload_sha256, version)
+        );
+        
+        CREATE TABLE IF NOT EXISTS ai_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            auth_method TEXT,
+            attempt INTEGER,
+            round INTEGER,
+            hedge INTEGER DEFAULT 0,
+            status_code INTEGER,
+            latency_ms REAL,
+            outcome TEXT,
             error TEXT
         );
         
@@ -152,6 +218,7 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_extractions_ts ON extractions(timestamp);
         CREATE INDEX IF NOT EXISTS idx_generations_ts ON generations(timestamp);
         CREATE INDEX IF NOT EXISTS idx_errors_ts ON errors(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_ai_attempts_ts ON ai_attempts(timestamp);
     """)
     conn.commit()
     conn.close()
@@ -175,8 +242,40 @@ def _migrate_db():
         if "user_id" not in cols:
             db.execute("ALTER TABLE generations ADD COLUMN user_id TEXT")
             print("Migration: added user_id column to generations")
+        if "timings" not in cols:
+            db.execute("ALTER TABLE generations ADD COLUMN timings TEXT")
+            print("Migration: added timings column to generations")
+        cols = [r[1] for r in db.execute("PRAGMA table_info(extractions)").fetchall()]
+        if "cache_hit" not in cols:
+            db.execute("ALTER TABLE extractions ADD COLUMN cache_hit INTEGER DEFAULT 0")
+            print("Migration: added cache_hit column to extractions")
 _migrate_db()
 
+# Dashboard aggregates are kept up to date by triggers (see rollups.py).
+# /health's totals start from them and add what the writer commits.
+with get_db() as _db:
+    init_rollups(_db)
+    _health_base = rollup_totals(_db)
+
+# Telemetry writes go through one background writer thread in batched
+# transactions; reads borrow a pooled read-only connection (see telemetry_db.py)
+enable_wal(DB_PATH)
+telemetry = TelemetryWriter(DB_PATH)
+db_readers = ReaderPool(DB_PATH)
+
+# Uploads, certificates, extraction results and error reports are stored
+# once per distinct content, indexed by folder and name (see artifact_store.py).
+# Anything left in the old flat data/<folder>/ directories is moved in.
+artifacts = ArtifactStore(ARTIFACT_DIR, telemetry, db_readers)
+with get_db() as _db:
+    init_artifacts(_db)
+    _imported = import_flat_dirs(_db, artifacts, DATA_DIR, {
+        "generated": ("generations", "output_path"),
+        "uploads": ("extractions", "upload_path"),
+    })
+    if _imported:
+        print(f"Migration: moved {_imported} files into the artifact store")
+
 
 # ── Telemetry Helpers ──
 
@@ -186,41 +285,131 @@ def now_iso():
 def file_hash(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()[:16]
 
+def log_ai_attempts(attempts: list[dict]):
+    """Store per-attempt upstream latencies, for tuning hedging and retries."""
+    if not attempts:
+        return
+    ts = now_iso()
+    telemetry.write_many("""
+        INSERT INTO ai_attempts (timestamp, auth_method, attempt, round, hedge, status_code,
+            latency_ms, outcome, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(ts, a["auth_method"], a["attempt"], a["round"], 1 if a["hedge"] else 0, a["status"],
+           a["latency_ms"], a["outcome"], a["error"]) for a in attempts])
+
+
+# ── File Responses ──
+
+@lru_cache(maxsize=4096)
+def _file_sha256(path: str, mtime_ns: int, size: int) -> str:
+    # Keyed on mtime/size too, so a rewritten file is hashed again
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+async def file_response(request: Request, path: str, media_type: str, filename: str,
+                        disposition: str = "attachment", content_hash: str = None,
+                        headers: dict = None, conditional: bool = True) -> Response:
+    """Stream a stored file (sendfile where the server supports it) with a strong ETag.
+
+    The ETag is the file's SHA-256 (pass content_hash if it's already known).
+    Range/If-Range requests are served by FileResponse; with `conditional`,
+    a matching If-None-Match gets a 304 and no body.
+    """
+    stat = await asyncio.to_thread(os.stat, path)
+    if content_hash is None:
+        content_hash = await asyncio.to_thread(_file_sha256, path, stat.st_mtime_ns, stat.st_size)
+    etag = f'"{content_hash}"'
+    # no-cache: clients may keep a copy but revalidate (cheap 304s) every time
+    common = {"ETag": etag, "Cache-Control": "private, no-cache", **(headers or {})}
+    if conditional and _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=common)
+    return FileResponse(path, media_type=media_type, stat_result=stat,
+                        headers={**common, "Content-Disposition": f'{disposition}; filename="{filename}"'})
+
 def log_request(req: Request, endpoint: str, status: int, duration_ms: float, 
                 req_size: int = 0, resp_size: int = 0, error: str = None) -> str:
     rid = str(uuid.uuid4())[:12]
     key = req.headers.get("x-api-key", "")
     key_hash = hashlib.sha256(key.encode()).hexdigest()[:8] if key else ""
     
-    with get_db() as db:
-        db.execute("""
-            INSERT INTO requests (id, timestamp, endpoint, method, ip, user_agent, 
-                                  api_key_hash, status_code, duration_ms, error,
-                                  request_size_bytes, response_size_bytes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (rid, now_iso(), endpoint, req.method, 
-              req.headers.get("x-forwarded-for", req.client.host if req.client else "unknown"),
-              req.headers.get("user-agent", "")[:200],
-              key_hash, status, duration_ms, error, req_size, resp_size))
+    telemetry.write("""
+        INSERT INTO requests (id, timestamp, endpoint, method, ip, user_agent, 
+                              api_key_hash, status_code, duration_ms, error,
+                              request_size_bytes, response_size_bytes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (rid, now_iso(), endpoint, req.method, 
+          req.headers.get("x-forwarded-for", req.client.host if req.client else "unknown"),
+          req.headers.get("user-agent", "")[:200],
+          key_hash, status, duration_ms, error, req_size, resp_size))
     return rid
 
-def log_error(request_id: str, endpoint: str, error_type: str, message: str, 
-              tb: str = None, request_data: str = None):
+async def log_error(request_id: str, endpoint: str, error_type: str, message: str, 
+                    tb: str = None, request_data: str = None):
     eid = str(uuid.uuid4())[:12]
-    with get_db() as db:
-        db.execute("""
-            INSERT INTO errors (id, timestamp, request_id, endpoint, error_type, 
-                               error_message, traceback, request_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (eid, now_iso(), request_id, endpoint, error_type, message[:2000], 
-              tb[:5000] if tb else None, request_data[:5000] if request_data else None))
+    telemetry.write("""
+        INSERT INTO errors (id, timestamp, request_id, endpoint, error_type, 
+                           error_message, traceback, request_data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (eid, now_iso(), request_id, endpoint, error_type, message[:2000], 
+          tb[:5000] if tb else None, request_data[:5000] if request_data else None))
     
-    # Also save to error file for easy grep
-    error_file = os.path.join(DATA_DIR, "errors", f"{eid}.json")
-    with open(error_file, "w") as f:
-        json.dump({"id": eid, "timestamp": now_iso(), "request_id": request_id,
-                    "endpoint": endpoint, "type": error_type, "message": message,
-                    "traceback": tb}, f, indent=2)
+    # Also keep the full report (untruncated) as an artifact; hashing and
+    # writing it is file I/O, so off the event loop
+    await asyncio.to_thread(artifacts.put, "errors", f"{eid}.json", json.dumps(
+        {"id": eid, "timestamp": now_iso(), "request_id": request_id,
+         "endpoint": endpoint, "type": error_type, "message": message,
+         "traceback": tb}, indent=2).encode())
+
+
+GENERATION_INSERT = """
+    INSERT INTO generations (id, request_id, timestamp, form_type, insured_name, carrier,
+        cert_holder_name, policy_number, coverages, additional_insured, waiver_of_sub,
+        primary_noncontrib, agency_name, has_signature, signature_mode, fields_filled,
+        fields_total, fields_skipped, output_path, output_size_bytes, input_data,
+        cert_holder_data, agency_data, flatten, user_id, error, timings)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def generation_values(gen_id: str, rid: str, form_type: str, policy: dict, holder: dict,
+                      agency_info: dict, signature: str, signature_mode: str, result: dict,
+                      gen_path: str, output_size: int, policy_data: str, cert_holder: str,
+                      agency: str, flatten: bool, user: Optional[dict], error: str = None) -> tuple:
+    """Build the parameter tuple for GENERATION_INSERT."""
+    coverages = []
+    for cn in ["gl", "auto", "umbrella", "workers_comp", "property"]:
+        if policy.get("coverages", {}).get(cn, {}).get("has"):
+            coverages.append(cn)
+    
+    return (gen_id, rid, now_iso(), form_type,
+            policy.get("insured", {}).get("name", ""),
+            policy.get("policy", {}).get("carrier", ""),
+            holder.get("name", ""),
+            policy.get("policy", {}).get("number", ""),
+            json.dumps(coverages),
+            1 if holder.get("additional_insured") else 0,
+            1 if holder.get("waiver_of_subrogation") else 0,
+            1 if holder.get("primary_noncontributory") else 0,
+            agency_info.get("name", ""),
+            1 if signature else 0,
+            signature_mode,
+            result.get("filled_count"), result.get("total_fields"),
+            json.dumps(result.get("skipped_fields", [])),
+            gen_path, output_size,
+            policy_data[:10000], cert_holder[:5000], agency[:5000],
+            1 if flatten else 0,
+            user["id"] if user else None,
+            error,
+            json.dumps(result["timings"]) if result.get("timings") else None)
 
 
 # ── Auth ──
@@ -230,32 +419,99 @@ def check_auth(x_api_key: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 
-# ── PDF Functions ──
-
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    text = ""
-    for page in doc:
-        text += page.get_text() + "\n"
-    doc.close()
-    return text
-
-def pdf_pages_to_images(pdf_bytes: bytes, dpi: int = 150) -> list[str]:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    images = []
-    for page in doc:
-        pix = page.get_pixmap(dpi=dpi)
-        img_bytes = pix.tobytes("png")
-        images.append(base64.b64encode(img_bytes).decode())
-    doc.close()
-    return images
+# ── Extraction Cache ──
 
+# Since server start; the table's hits column has the all-time per-entry counts
+extract_cache_stats = {"hits": 0, "misses": 0, "refreshes": 0, "coalesced": 0}
 
-async def extract_policy_data_with_ai(pdf_bytes: bytes) -> dict:
-    text = extract_text_from_pdf(pdf_bytes)
-    use_vision = len(text.strip()) < 200
-    
-    extraction_prompt = """Extract the following structured data from this insurance policy declaration page. Return ONLY valid JSON, no explanation.
+def extraction_cache_get(digest: str) -> Optional[tuple[dict, dict]]:
+    """Cached (extracted_data, meta) for an upload's SHA-256, or None."""
+    if EXTRACT_CACHE_TTL <= 0:
+        return None
+    with db_readers.connection() as db:
+        row = db.execute(
+            "SELECT extracted_data, meta, created_at FROM extraction_cache "
+            "WHERE upload_sha256 = ? AND version = ?", (digest, EXTRACTION_VERSION)).fetchone()
+    if row is None:
+        return None
+    if time.time() - row["created_at"] > EXTRACT_CACHE_TTL:
+        telemetry.write("DELETE FROM extraction_cache WHERE upload_sha256 = ? AND version = ?",
+                        (digest, EXTRACTION_VERSION))
+        return None
+    telemetry.write("UPDATE extraction_cache SET hits = hits + 1 "
+                    "WHERE upload_sha256 = ? AND version = ?", (digest, EXTRACTION_VERSION))
+    return json.loads(row["extracted_data"]), json.loads(row["meta"] or "{}")
+
+def extraction_cache_put(digest: str, eid: str, result: dict, meta: dict) -> None:
+    if EXTRACT_CACHE_TTL <= 0:
+        return
+    telemetry.write(
+        "INSERT OR REPLACE INTO extraction_cache (upload_sha256, version, created_at, "
+        "extraction_id, extracted_data, meta) VALUES (?, ?, ?, ?, ?, ?)",
+        (digest, EXTRACTION_VERSION, time.time(), eid, json.dumps(result), json.dumps(meta)))
+
+
+# Upload SHA-256 -> the AI extraction currently running for it
+_extractions_in_flight: dict[str, asyncio.Task] = {}
+
+async def extract_single_flight(digest: str, pdf_path: str) -> tuple[dict, bool]:
+    """extract_policy_data_with_ai, shared by concurrent requests for one document.
+
+    The first request starts the AI call; any request for the same upload
+    hash that arrives before it finishes awaits that call instead of making
+    its own. The call is shielded, so a client that disconnects doesn't
+    cancel it for the others.
+
+    Returns:
+        (result, shared) — result is the caller's own copy; shared is True
+        if another request's call was reused
+    """
+    task = _extractions_in_flight.get(digest)
+    shared = task is not None
+    if task is None:
+        task = asyncio.ensure_future(extract_policy_data_with_ai(pdf_path))
+        _extractions_in_flight[digest] = task
+        task.add_done_callback(lambda _: _extractions_in_flight.pop(digest, None))
+    result = await asyncio.shield(task)
+    return copy.deepcopy(result), shared
+
+
+# ── Uploads ──
+
+def spool_upload(src, dest_dir: str) -> tuple[str, str, int]:
+    """Copy an upload to a temp file in dest_dir, chunk by chunk.
+
+    Hashes as it goes and stops as soon as the size limit is passed or the
+    first chunk doesn't look like a PDF, so a bad upload is never read whole.
+
+    Returns:
+        (temp_path, sha256 hex digest, size in bytes) — the caller renames
+        or removes temp_path
+    Raises:
+        ValueError: too large or not a PDF (temp file already removed)
+    """
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := src.read(UPLOAD_CHUNK):
+                if size == 0 and b"%PDF-" not in chunk[:1024]:
+                    raise ValueError("Not a PDF file")
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise ValueError(f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)}MB)")
+                sha.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise ValueError("Empty file")
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, sha.hexdigest(), size
+
+
+EXTRACTION_PROMPT = """Extract the following structured data from this insurance policy declaration page. Return ONLY valid JSON, no explanation.
 
 {
   "insured": {
@@ -284,31 +540,39 @@ async def extract_policy_data_with_ai(pdf_bytes: bytes) -> dict:
 
 Only include coverages that are actually present. Set "has": false for coverages not found. Use empty strings for fields not found."""
 
+# Cached extractions are only reused while model and prompt are unchanged
+EXTRACTION_VERSION = hashlib.sha256(f"{AI_MODEL}\n{EXTRACTION_PROMPT}".encode()).hexdigest()[:12]
+
+
+async def extract_policy_data_with_ai(pdf_path: str) -> dict:
+    text = await get_render_pool().run(extract_text_from_pdf, pdf_path)
+    use_vision = len(text.strip()) < 200
+    
     messages = []
     if use_vision:
-        images = pdf_pages_to_images(pdf_bytes, dpi=150)
-        content = [{"type": "text", "text": extraction_prompt}]
-        for img in images[:5]:
+        images = await get_render_pool().run(pdf_pages_to_images, pdf_path, 150, 5)
+        content = [{"type": "text", "text": EXTRACTION_PROMPT}]
+        for img in images:
             content.append({"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": img}})
         messages = [{"role": "user", "content": content}]
     else:
-        messages = [{"role": "user", "content": f"{extraction_prompt}\n\nDocument text:\n{text[:15000]}"}]
+        messages = [{"role": "user", "content": f"{EXTRACTION_PROMPT}\n\nDocument text:\n{text[:15000]}"}]
 
     ai_start = time.time()
     resp_ok = False
     ai_text_result = ""
     usage = {}
+    ai_attempts = []  # one entry per HTTP attempt, including hedges and retries
 
     # Try direct Anthropic API first
     if ANTHROPIC_KEY:
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                resp = await client.post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers={"x-api-key": ANTHROPIC_KEY, "anthropic-version": "2023-06-01", "content-type": "application/json"},
-                    json={"model": "claude-sonnet-4-20250514", "max_tokens": 4096, "messages": messages},
-                )
-            if resp.status_code == 200:
+            resp, attempts = await post_hedged(
+                "/v1/messages", headers={"x-api-key": ANTHROPIC_KEY},
+                json={"model": AI_MODEL, "max_tokens": 4096, "messages": messages},
+            )
+            ai_attempts += [dict(a, auth_method="api_key") for a in attempts]
+            if resp is not None and resp.status_code == 200:
                 result = resp.json()
                 ai_text_result = result["content"][0]["text"]
                 usage = result.get("usage", {})
@@ -316,40 +580,20 @@ Only include coverages that are actually present. Set "has": false for coverages
         except Exception as e:
             pass
 
-    # Fallback: resolve fresh token from openclaw auth system
+    # Fallback: resolve fresh token from openclaw auth system (cached, and
+    # skipped while its circuit breaker is open)
     if not resp_ok:
-        import subprocess as _sp
-        try:
-            _proc = _sp.run(
-                ["bash", "-c", """source /root/.nvm/nvm.sh && nvm use 22 >/dev/null 2>&1 && node -e "
-const { resolveProviderAuth } = require('openclaw/dist/auth/resolve.js');
-resolveProviderAuth('anthropic').then(r => console.log(r.token || r.apiKey || '')).catch(() => process.exit(1));
-" 2>/dev/null || openclaw health --json 2>/dev/null | python3 -c "import sys,json; print('')" """],
-                capture_output=True, text=True, timeout=15
-            )
-            fresh_key = _proc.stdout.strip()
-        except Exception:
-            fresh_key = ""
-        
-        if not fresh_key:
-            # Last resort: read from auth-profiles and try anyway
-            try:
-                import json as _json
-                with open("/root/.openclaw/agents/main/agent/auth-profiles.json") as _f:
-                    _ap = _json.load(_f)
-                fresh_key = _ap.get("profiles", {}).get("anthropic:default", {}).get("token", "")
-            except Exception:
-                fresh_key = ""
-
+        fresh_key = await resolve_fallback_key()
         if fresh_key:
+            key_status = None
             try:
-                async with httpx.AsyncClient(timeout=60) as client:
-                    resp = await client.post(
-                        "https://api.anthropic.com/v1/messages",
-                        headers={"x-api-key": fresh_key, "anthropic-version": "2023-06-01", "content-type": "application/json"},
-                        json={"model": "claude-sonnet-4-20250514", "max_tokens": 4096, "messages": messages},
-                    )
-                if resp.status_code == 200:
+                resp, attempts = await post_hedged(
+                    "/v1/messages", headers={"x-api-key": fresh_key},
+                    json={"model": AI_MODEL, "max_tokens": 4096, "messages": messages},
+                )
+                ai_attempts += [dict(a, auth_method="openclaw_fallback") for a in attempts]
+                key_status = resp.status_code if resp is not None else None
+                if key_status == 200:
                     result = resp.json()
                     ai_text_result = result["content"][0]["text"]
                     usage = result.get("usage", {})
@@ -360,28 +604,24 @@ resolveProviderAuth('anthropic').then(r => console.log(r.token || r.apiKey || ''
                     globals()["ANTHROPIC_KEY"] = fresh_key
             except Exception:
                 pass
+            report_fallback_key(fresh_key, key_status)
 
     # Last fallback: use openclaw CLI directly
     if not resp_ok:
-        import subprocess as _sp
-        prompt_for_cli = extraction_prompt + "\n\nDocument text:\n" + text[:15000]
-        try:
-            _proc = _sp.run(
-                ["bash", "-c", 'source /root/.nvm/nvm.sh && nvm use 22 >/dev/null 2>&1 && openclaw agent --agent main --local -m "$1"', "_", prompt_for_cli],
-                capture_output=True, text=True, timeout=90
-            )
-            if _proc.returncode == 0 and _proc.stdout.strip():
-                ai_text_result = _proc.stdout.strip()
-                usage = {"auth_method": "openclaw_cli"}
-                resp_ok = True
-        except Exception:
-            pass
+        prompt_for_cli = EXTRACTION_PROMPT + "\n\nDocument text:\n" + text[:15000]
+        cli_text = await run_cli_fallback(prompt_for_cli)
+        if cli_text:
+            ai_text_result = cli_text
+            usage = {"auth_method": "openclaw_cli"}
+            resp_ok = True
 
     ai_duration = (time.time() - ai_start) * 1000
+    log_ai_attempts(ai_attempts)
+    attempt_meta = {"ai_attempts": len(ai_attempts), "ai_hedged": any(a["hedge"] for a in ai_attempts)}
 
     if not resp_ok:
         return {"raw_text": text, "error": "AI extraction failed: all auth methods exhausted (direct API + openclaw fallback + CLI)",
-                "_meta": {"used_vision": use_vision, "ai_duration_ms": ai_duration}}
+                "_meta": {"used_vision": use_vision, "ai_duration_ms": ai_duration, **attempt_meta}}
 
     ai_text = ai_text_result
     # Reconstruct result-like object for downstream code
@@ -396,15 +636,16 @@ resolveProviderAuth('anthropic').then(r => console.log(r.token || r.apiKey || ''
         parsed["_meta"] = {
             "used_vision": use_vision,
             "text_length": len(text),
-            "ai_model": "claude-sonnet-4-20250514",
+            "ai_model": AI_MODEL,
             "ai_prompt_tokens": usage.get("input_tokens", 0),
             "ai_completion_tokens": usage.get("output_tokens", 0),
             "ai_duration_ms": ai_duration,
+            **attempt_meta,
         }
         return parsed
     except (ValueError, json.JSONDecodeError) as e:
         return {"raw_text": text, "ai_response": ai_text, "error": f"Parse error: {e}",
-                "_meta": {"used_vision": use_vision, "ai_duration_ms": ai_duration}}
+                "_meta": {"used_vision": use_vision, "ai_duration_ms": ai_duration, **attempt_meta}}
 
 
 # ── ACORD Field Mapping ──
@@ -526,56 +767,49 @@ def map_to_acord25(policy_data: dict, cert_holder: dict, agency: dict) -> dict:
         fields[f"{p}WorkersCompensation_DiseasePolicyLimit_LimitAmount_A[0]"] = wc.get("el_disease_policy", "")
         fields[f"{p}WorkersCompensation_DiseaseEachEmployee_LimitAmount_A[0]"] = wc.get("el_disease_each", "")
     
-    # Certificate Holder
-    ch = cert_holder
-    fields[f"{p}CertificateHolder_FullName_A[0]"] = ch.get("name", "")
-    fields[f"{p}CertificateHolder_MailingAddress_LineOne_A[0]"] = ch.get("address_line1", "")
-    fields[f"{p}CertificateHolder_MailingAddress_LineTwo_A[0]"] = ch.get("address_line2", "")
-    fields[f"{p}CertificateHolder_MailingAddress_CityName_A[0]"] = ch.get("city", "")
-    fields[f"{p}CertificateHolder_MailingAddress_StateOrProvinceCode_A[0]"] = ch.get("state", "")
-    fields[f"{p}CertificateHolder_MailingAddress_PostalCode_A[0]"] = ch.get("zip", "")
-    
-    # Description
-    desc_parts = []
-    if ch.get("additional_insured"):
-        desc_parts.append(f"{ch['name']} is included as Additional Insured as required by written contract.")
-    if ch.get("waiver_of_subrogation"):
-        desc_parts.append("Waiver of Subrogation applies in favor of the Certificate Holder as required by written contract.")
-    if ch.get("primary_noncontributory"):
-        desc_parts.append("Coverage is Primary and Non-Contributory as required by written contract.")
-    if ch.get("additional_description"):
-        desc_parts.append(ch["additional_description"])
-    if desc_parts:
-        fields[f"{p}CertificateOfLiabilityInsurance_ACORDForm_RemarkText_A[0]"] = "\n".join(desc_parts)
-    
-    if ch.get("additional_insured"):
-        if gl.get("has"): fields[f"{p}CertificateOfInsurance_GeneralLiability_AdditionalInsuredCode_A[0]"] = "Y"
-        if auto.get("has"): fields[f"{p}CertificateOfInsurance_AutomobileLiability_AdditionalInsuredCode_A[0]"] = "Y"
-    
+    fields.update(map_cert_holder_acord25(policy_data, cert_holder))
     return fields
 
 
+@app.on_event("shutdown")
+async def shutdown_pools():
+    shutdown_render()
+    shutdown_ocr()
+    await close_ai_client()
+    telemetry.close()
+    db_readers.close()
+
 
 # ── API Endpoints ──
 
 @app.get("/health")
 async def health():
-    with get_db() as db:
-        stats = db.execute("SELECT COUNT(*) as c FROM requests").fetchone()
-        extractions = db.execute("SELECT COUNT(*) as c FROM extractions").fetchone()
-        generations = db.execute("SELECT COUNT(*) as c FROM generations").fetchone()
-        errors = db.execute("SELECT COUNT(*) as c FROM errors").fetchone()
+    """Liveness: in-memory counters only, no DB or worker round trips."""
     return {
         "status": "ok", "service": "acord-api-v2", "forms": list(BLANK_FORMS.keys()),
-        "stats": {
-            "total_requests": stats["c"], "total_extractions": extractions["c"],
-            "total_generations": generations["c"], "total_errors": errors["c"],
-        }
+        "stats": {f"total_{table}": _health_base.get(table, 0) + telemetry.inserted.get(table, 0)
+                  for table in ("requests", "extractions", "generations", "errors")},
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: blanks loaded, render workers alive, telemetry writes committing."""
+    checks = {
+        "templates": all(template_loaded(path) for path in BLANK_FORMS.values()
+                         if os.path.exists(path)),
+        # Not a round trip through the pool: under load a ping would wait
+        # behind real renders and fail exactly when the instance is busiest
+        "render_pool": get_render_pool().healthy(),
+        "telemetry_db": await asyncio.to_thread(telemetry.flush, READY_TIMEOUT),
     }
+    ok = all(checks.values())
+    return JSONResponse({"ready": ok, "checks": checks}, status_code=200 if ok else 503)
 
 
 @app.post("/api/extract")
-async def extract_policy(request: Request, file: UploadFile = File(...), x_api_key: str = Header(None)):
+async def extract_policy(request: Request, file: UploadFile = File(...), x_api_key: str = Header(None),
+                         refresh: bool = Form(False)):
     check_auth(x_api_key)
     start = time.time()
     
@@ -594,26 +828,58 @@ async def extract_policy(request: Request, file: UploadFile = File(...), x_api_k
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(400, "Only PDF files accepted")
     
-    pdf_bytes = await file.read()
-    if len(pdf_bytes) > 20 * 1024 * 1024:
-        raise HTTPException(400, "File too large (max 20MB)")
+    # Stream to a temp file and check it opens as a PDF with a sane page
+    # count; only then is it moved into the artifact store
+    try:
+        tmp_path, digest, upload_size = await asyncio.to_thread(spool_upload, file.file,
+                                                                artifacts.tmp_dir)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    try:
+        pages = await get_render_pool().run(pdf_page_count, tmp_path)
+    except Exception:
+        pages = 0
+    if not 0 < pages <= MAX_UPLOAD_PAGES:
+        os.unlink(tmp_path)
+        raise HTTPException(400, "Unreadable PDF" if not pages
+                            else f"Too many pages ({pages}, max {MAX_UPLOAD_PAGES})")
     
-    # Save uploaded file
-    fhash = file_hash(pdf_bytes)
-    upload_path = os.path.join(DATA_DIR, "uploads", f"{fhash}_{file.filename}")
-    with open(upload_path, "wb") as f:
-        f.write(pdf_bytes)
+    # Save uploaded file (a re-upload of the same PDF reuses the stored copy)
+    fhash = digest[:16]
+    upload = await asyncio.to_thread(artifacts.put_file, "uploads",
+                                     f"{fhash}_{os.path.basename(file.filename)}", tmp_path, digest)
+    upload_path = upload.path
     
     try:
-        result = await extract_policy_data_with_ai(pdf_bytes)
+        # A document we've already extracted (same model and prompt) skips
+        # the AI call; refresh=true forces a new extraction
+        cached = None if refresh else extraction_cache_get(digest)
+        if cached:
+            result, meta = cached
+            # No AI time or tokens spent on this request
+            meta.update(ai_duration_ms=0, ai_prompt_tokens=0, ai_completion_tokens=0, cache_hit=True)
+            extract_cache_stats["hits"] += 1
+            cache_status = "hit"
+        else:
+            result, shared = await extract_single_flight(digest, upload_path)
+            meta = result.pop("_meta", {})
+            if shared:
+                # Another request paid for this call; don't count its tokens or
+                # upstream time twice (the extract_ms rollup skips zero rows)
+                meta.update(ai_duration_ms=0, ai_prompt_tokens=0, ai_completion_tokens=0,
+                            coalesced=True)
+                extract_cache_stats["coalesced"] += 1
+                cache_status = "coalesced"
+            else:
+                extract_cache_stats["refreshes" if refresh else "misses"] += 1
+                cache_status = "refresh" if refresh else "miss"
         duration = (time.time() - start) * 1000
         
         # Log request
-        rid = log_request(request, "/api/extract", 200, duration, len(pdf_bytes), 
+        rid = log_request(request, "/api/extract", 200, duration, upload_size, 
                          len(json.dumps(result).encode()))
         
         # Log extraction details
-        meta = result.pop("_meta", {})
         coverages_found = []
         for cov_name in ["gl", "auto", "umbrella", "workers_comp", "property"]:
             if result.get("coverages", {}).get(cov_name, {}).get("has"):
@@ -640,35 +906,36 @@ async def extract_policy(request: Request, file: UploadFile = File(...), x_api_k
             return round((filled / total * 100) if total > 0 else 0)
         eq_score = _calc_quality(result)
 
-        with get_db() as db:
-            db.execute("""
+        telemetry.write("""
             INSERT INTO extractions (id, request_id, timestamp, upload_filename, upload_size_bytes,
                     upload_hash, upload_path, text_length, used_vision, ai_model,
                     ai_prompt_tokens, ai_completion_tokens, ai_duration_ms, extracted_data,
-                    insured_name, carrier, coverages_found, extraction_quality)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (eid, rid, now_iso(), file.filename, len(pdf_bytes), fhash, upload_path,
+                    insured_name, carrier, coverages_found, extraction_quality, cache_hit)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (eid, rid, now_iso(), file.filename, upload_size, fhash, upload_path,
                   meta.get("text_length", 0), 1 if meta.get("used_vision") else 0,
                   meta.get("ai_model", ""), meta.get("ai_prompt_tokens", 0),
                   meta.get("ai_completion_tokens", 0), meta.get("ai_duration_ms", 0),
                   json.dumps(result), result.get("insured", {}).get("name", ""),
-                  result.get("policy", {}).get("carrier", ""), json.dumps(coverages_found), str(eq_score)))
+                  result.get("policy", {}).get("carrier", ""), json.dumps(coverages_found), str(eq_score),
+                  1 if cached else 0))
+        if cache_status in ("miss", "refresh") and "error" not in result:
+            extraction_cache_put(digest, eid, result, meta)
         
         # Save extraction result
-        ext_path = os.path.join(DATA_DIR, "extractions", f"{eid}.json")
-        with open(ext_path, "w") as f:
-            json.dump({"extraction_id": eid, "request_id": rid, "filename": file.filename,
-                       "result": result, "meta": meta}, f, indent=2)
+        await asyncio.to_thread(artifacts.put, "extractions", f"{eid}.json", json.dumps(
+            {"extraction_id": eid, "request_id": rid, "filename": file.filename,
+             "result": result, "meta": meta}, indent=2).encode())
         
         if "error" in result:
-            log_error(rid, "/api/extract", "extraction_partial", result["error"])
+            await log_error(rid, "/api/extract", "extraction_partial", result["error"])
         
-        return JSONResponse(result)
+        return JSONResponse(result, headers={"X-Extraction-Cache": cache_status})
         
     except Exception as e:
         duration = (time.time() - start) * 1000
-        rid = log_request(request, "/api/extract", 500, duration, len(pdf_bytes), 0, str(e))
-        log_error(rid, "/api/extract", type(e).__name__, str(e), traceback.format_exc())
+        rid = log_request(request, "/api/extract", 500, duration, upload_size, 0, str(e))
+        await log_error(rid, "/api/extract", type(e).__name__, str(e), traceback.format_exc())
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
@@ -683,6 +950,8 @@ async def generate_certificate(
     signature: str = Form(""),
     signature_mode: str = Form(""),
     flatten: bool = Form(True),
+    flatten_mode: str = Form("raster"),
+    ocr: bool = Form(False),
 ):
     check_auth(x_api_key)
     start = time.time()
@@ -701,6 +970,8 @@ async def generate_certificate(
     
     if form_type not in BLANK_FORMS:
         raise HTTPException(400, f"Unsupported form: {form_type}")
+    if flatten_mode not in FLATTEN_MODES:
+        raise HTTPException(400, f"Unsupported flatten mode: {flatten_mode}")
     
     try:
         policy = json.loads(policy_data)
@@ -709,140 +980,316 @@ async def generate_certificate(
     except json.JSONDecodeError as e:
         raise HTTPException(400, f"Invalid JSON: {e}")
     
+    timings = StageTimings()
     try:
         # Map fields
-        if form_type == "25":
-            field_data = map_to_acord25(policy, holder, agency_info)
-        else:
-            field_data = {**policy, **holder}
+        with timings.stage("map"):
+            if form_type == "25":
+                field_data = map_to_acord25(policy, holder, agency_info)
+            else:
+                field_data = {**policy, **holder}
         
         blank_path = BLANK_FORMS[form_type]
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            output_path = tmp.name
         
-        from fill_acord import fill_acord_form
-        result = fill_acord_form(blank_path, field_data, output_path, flatten=flatten)
+        # Fill/flatten/sign in the render pool so the event loop stays free;
+        # the worker's stages come back in result["timings"]
+        pdf_bytes, result = await get_render_pool().run(
+            render_certificate, blank_path, field_data, signature, flatten and flatten_mode,
+            StageTimings(), timings=timings)
+        timings.merge(result["timings"])
+        if result["signature_error"]:
+            await log_error("", "/api/generate", "signature_overlay", result["signature_error"],
+                            result["signature_traceback"])
         
-        # Handle signature overlay
-        if signature:
-            try:
-                doc = fitz.open(output_path)
-                page = doc[0]
-                # Signature placement — authorized representative area on ACORD 25
-                sig_rect = fitz.Rect(320, 720, 580, 745)
-                
-                if signature.startswith("data:image"):
-                    # Image signature
-                    sig_data = signature.split(",", 1)[1]
-                    sig_bytes = base64.b64decode(sig_data)
-                    page.insert_image(sig_rect, stream=sig_bytes)
-                else:
-                    # Typed signature — render in cursive font
-                    font_path = os.path.join(BASE_DIR, "DancingScript.ttf")
-                    if os.path.exists(font_path):
-                        page.insert_font(fontname="cursive", fontfile=font_path)
-                        # Center the text in the signature area
-                        font_size = 18
-                        text_width = len(signature) * font_size * 0.45
-                        x = sig_rect.x0 + (sig_rect.width - text_width) / 2
-                        y = sig_rect.y0 + 18
-                        page.insert_text((x, y), signature, fontname="cursive", fontsize=font_size, color=(0.05, 0.05, 0.15))
-                    else:
-                        # Fallback: use Helvetica italic-ish
-                        page.insert_text((sig_rect.x0 + 10, sig_rect.y0 + 16), signature, fontname="helv", fontsize=14, color=(0.05, 0.05, 0.15))
-                
-                doc.save(output_path + "_sig.pdf")
-                doc.close()
-                os.rename(output_path + "_sig.pdf", output_path)
-            except Exception as sig_err:
-                log_error("", "/api/generate", "signature_overlay", str(sig_err), traceback.format_exc())
-        
-        with open(output_path, "rb") as f:
-            pdf_bytes = f.read()
+        # OCR image-only output through the shared pool (searchable/vector
+        # output already has its text). Timed by hand: the event loop thread's
+        # CPU time isn't this request's.
+        if ocr and flatten and flatten_mode == "raster":
+            ocr_start = time.perf_counter()
+            pdf_bytes, ocr_stats = await ocr_pdf_async(pdf_bytes)
+            timings.add("ocr", time.perf_counter() - ocr_start, 0.0, len(pdf_bytes))
+            result.update(ocr_stats, output_bytes=len(pdf_bytes))
+            if ocr_stats["ocr_error"]:
+                await log_error("", "/api/generate", "ocr", ocr_stats["ocr_error"])
         
         # Save generated cert
         gen_id = str(uuid.uuid4())[:12]
         gen_filename = f"{gen_id}_ACORD-{form_type}_{holder.get('name', 'cert').replace(' ', '_')}.pdf"
-        gen_path = os.path.join(DATA_DIR, "generated", gen_filename)
-        with open(gen_path, "wb") as f:
-            f.write(pdf_bytes)
+        write_start = time.perf_counter()
+        stored = await asyncio.to_thread(artifacts.put, "generated", gen_filename, pdf_bytes)
+        gen_path = stored.path
+        timings.add("write", time.perf_counter() - write_start, 0.0, len(pdf_bytes))
+        result["timings"] = timings.as_dict()
         
         duration = (time.time() - start) * 1000
         rid = log_request(request, "/api/generate", 200, duration, 
                          len(policy_data) + len(cert_holder), len(pdf_bytes))
         
         # Log generation details
-        coverages = []
-        for cn in ["gl", "auto", "umbrella", "workers_comp", "property"]:
-            if policy.get("coverages", {}).get(cn, {}).get("has"):
-                coverages.append(cn)
-        
-        with get_db() as db:
-            db.execute("""
-                INSERT INTO generations (id, request_id, timestamp, form_type, insured_name, carrier,
-                    cert_holder_name, policy_number, coverages, additional_insured, waiver_of_sub,
-                    primary_noncontrib, agency_name, has_signature, signature_mode, fields_filled,
-                    fields_total, fields_skipped, output_path, output_size_bytes, input_data,
-                    cert_holder_data, agency_data, flatten, user_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (gen_id, rid, now_iso(), form_type,
-                  policy.get("insured", {}).get("name", ""),
-                  policy.get("policy", {}).get("carrier", ""),
-                  holder.get("name", ""),
-                  policy.get("policy", {}).get("number", ""),
-                  json.dumps(coverages),
-                  1 if holder.get("additional_insured") else 0,
-                  1 if holder.get("waiver_of_subrogation") else 0,
-                  1 if holder.get("primary_noncontributory") else 0,
-                  agency_info.get("name", ""),
-                  1 if signature else 0,
-                  signature_mode,
-                  result["filled_count"], result["total_fields"],
-                  json.dumps(result.get("skipped_fields", [])),
-                  gen_path, len(pdf_bytes),
-                  policy_data[:10000], cert_holder[:5000], agency[:5000],
-                  1 if flatten else 0,
-                  _current_user["id"] if _current_user else None))
-        
-        os.remove(output_path)
+        telemetry.write(GENERATION_INSERT, generation_values(
+            gen_id, rid, form_type, policy, holder, agency_info, signature, signature_mode,
+            result, gen_path, len(pdf_bytes), policy_data, cert_holder, agency, flatten,
+            _current_user))
         
         filename = f"ACORD-{form_type}-{holder.get('name', 'cert').replace(' ', '_')}-{datetime.now().strftime('%Y%m%d')}.pdf"
-        return Response(
-            content=pdf_bytes, media_type="application/pdf",
+        return await file_response(
+            request, gen_path, "application/pdf", filename,
+            content_hash=stored.sha256, conditional=False,
             headers={
-                "Content-Disposition": f'attachment; filename="{filename}"',
                 "X-Fields-Filled": str(result["filled_count"]),
                 "X-Fields-Total": str(result["total_fields"]),
                 "X-Generation-Id": gen_id,
+                "Server-Timing": f"{timings.server_timing()}, total;dur={duration:.1f}",
             }
         )
         
     except Exception as e:
         duration = (time.time() - start) * 1000
         rid = log_request(request, "/api/generate", 500, duration, 0, 0, str(e))
-        log_error(rid, "/api/generate", type(e).__name__, str(e), traceback.format_exc(),
-                  json.dumps({"form_type": form_type, "insured": policy.get("insured", {}).get("name", "")}))
+        await log_error(rid, "/api/generate", type(e).__name__, str(e), traceback.format_exc(),
+                        json.dumps({"form_type": form_type, "insured": policy.get("insured", {}).get("name", "")}))
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+class _ZipStream(io.RawIOBase):
+    """Write-only sink for zipfile that hands back what was written so far.
+
+    It isn't seekable, so zipfile writes data descriptors after each member
+    and we can flush every finished certificate to the client immediately.
+    """
+    def __init__(self):
+        self._buf = bytearray()
+    
+    def writable(self):
+        return True
+    
+    def write(self, b):
+        self._buf += b
+        return len(b)
+    
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+@app.post("/api/generate/bulk")
+async def generate_bulk(
+    request: Request,
+    x_api_key: str = Header(None),
+    form_type: str = Form("25"),
+    policy_data: str = Form(...),
+    cert_holders: str = Form(...),
+    agency: str = Form("{}"),
+    signature: str = Form(""),
+    signature_mode: str = Form(""),
+    flatten: bool = Form(True),
+    flatten_mode: str = Form("raster"),
+    output: str = Form("zip"),
+):
+    """Issue one policy's certificate to many holders.
+    
+    `cert_holders` is a JSON list of cert_holder objects. Certificates render
+    concurrently in the render pool. output=zip streams the ZIP back as each
+    certificate finishes; output=pdf returns one merged PDF in holder order.
+    One generations row per holder is written in a single transaction.
+    
+    Failures are listed in errors.json inside the ZIP. The ZIP's headers go
+    out before any certificate has rendered, so unlike output=pdf it has no
+    X-Certificates-Failed header.
+    """
+    check_auth(x_api_key)
+    start = time.time()
+    current_user = get_current_user(request)
+    
+    if form_type not in BLANK_FORMS:
+        raise HTTPException(400, f"Unsupported form: {form_type}")
+    if flatten_mode not in FLATTEN_MODES:
+        raise HTTPException(400, f"Unsupported flatten mode: {flatten_mode}")
+    if output not in ("zip", "pdf"):
+        raise HTTPException(400, f"Unsupported output: {output}")
+    
+    try:
+        policy = json.loads(policy_data)
+        holders = json.loads(cert_holders)
+        agency_info = json.loads(agency)
+    except json.JSONDecodeError as e:
+        raise HTTPException(400, f"Invalid JSON: {e}")
+    if not isinstance(holders, list) or not holders:
+        raise HTTPException(400, "cert_holders must be a non-empty JSON list")
+    if len(holders) > MAX_BULK_HOLDERS:
+        raise HTTPException(400, f"Too many certificate holders (max {MAX_BULK_HOLDERS})")
+    if not all(isinstance(h, dict) for h in holders):
+        raise HTTPException(400, "Each cert_holders entry must be a JSON object")
+    
+    blank_path = BLANK_FORMS[form_type]
+    pool = get_render_pool()
+    mode = flatten and flatten_mode
+    
+    # The policy/agency part of the mapping is identical for every holder.
+    # Raster/searchable ACORD 25 goes through the compositor: each worker renders
+    # the policy page once and only re-renders the holder block per certificate.
+    if form_type == "25":
+        base_fields = map_to_acord25(policy, {}, agency_info)
+        holder_sets = [map_cert_holder_acord25(policy, h) for h in holders]
+        if mode in RASTER_MODES:
+            jobs = [(render_composited, blank_path, base_fields, hf, signature,
+                     mode == "searchable", StageTimings()) for hf in holder_sets]
+        else:
+            jobs = [(render_certificate, blank_path, {**base_fields, **hf}, signature, mode,
+                     StageTimings()) for hf in holder_sets]
+    else:
+        jobs = [(render_certificate, blank_path, {**policy, **h}, signature, mode, StageTimings())
+                for h in holders]
+    
+    async def _render(i: int):
+        try:
+            pdf_bytes, result = await pool.run(*jobs[i])
+            return i, pdf_bytes, result, None
+        except Exception as e:
+            return i, None, None, e
+    
+    tasks = [asyncio.ensure_future(_render(i)) for i in range(len(holders))]
+    batch_id = str(uuid.uuid4())[:12]
+    names = [f"{i + 1:03d}_ACORD-{form_type}_{h.get('name', 'cert').replace(' ', '_')}.pdf"
+             for i, h in enumerate(holders)]
+    done = {}  # holder index -> (gen_id, gen_path, size, result, error)
+    
+    async def _save(i, pdf_bytes, result, err):
+        gen_id = str(uuid.uuid4())[:12]
+        if err is not None:
+            await log_error("", "/api/generate/bulk", type(err).__name__, str(err),
+                            "".join(traceback.format_exception(type(err), err, err.__traceback__)),
+                            json.dumps({"batch_id": batch_id, "holder": holders[i].get("name", "")}))
+            done[i] = (gen_id, None, 0, {}, str(err))
+            return
+        if result["signature_error"]:
+            await log_error("", "/api/generate/bulk", "signature_overlay", result["signature_error"],
+                            result["signature_traceback"])
+        stored = await asyncio.to_thread(artifacts.put, "generated", f"{gen_id}_{names[i][4:]}",
+                                         pdf_bytes)
+        done[i] = (gen_id, stored.path, len(pdf_bytes), result, None)
+    
+    def _record(status: int, resp_size: int, error: str = None):
+        duration = (time.time() - start) * 1000
+        rid = log_request(request, "/api/generate/bulk", status, duration,
+                          len(policy_data) + len(cert_holders), resp_size, error)
+        rows = [generation_values(gen_id, rid, form_type, policy, holders[i], agency_info,
+                                  signature, signature_mode, result, gen_path, size,
+                                  policy_data, json.dumps(holders[i]), agency, flatten,
+                                  current_user, err)
+                for i, (gen_id, gen_path, size, result, err) in sorted(done.items())]
+        telemetry.write_many(GENERATION_INSERT, rows)
+    
+    def failed():
+        return [{"holder": holders[i].get("name", ""), "error": d[4]}
+                for i, d in sorted(done.items()) if d[4]]
+    
+    filename = f"ACORD-{form_type}-bulk-{datetime.now().strftime('%Y%m%d')}-{batch_id}"
+    
+    if output == "pdf":
+        pdfs = []
+        for i, pdf_bytes, result, err in await asyncio.gather(*tasks):
+            await _save(i, pdf_bytes, result, err)
+            if pdf_bytes:
+                pdfs.append(pdf_bytes)
+        merged = await pool.run(merge_pdfs, pdfs) if pdfs else b""
+        _record(200 if pdfs else 500, len(merged), None if pdfs else "All certificates failed")
+        if not pdfs:
+            return JSONResponse({"error": "All certificates failed", "failed": failed()}, status_code=500)
+        return Response(
+            content=merged, media_type="application/pdf",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}.pdf"',
+                "X-Certificates-Total": str(len(holders)),
+                "X-Certificates-Failed": str(len(failed())),
+                "X-Batch-Id": batch_id,
+            }
+        )
+    
+    async def _stream_zip():
+        sink = _ZipStream()
+        sent = 0
+        finished = False
+        try:
+            with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+                for next_done in asyncio.as_completed(tasks):
+                    i, pdf_bytes, result, err = await next_done
+                    await _save(i, pdf_bytes, result, err)
+                    if pdf_bytes:
+                        zf.writestr(names[i], pdf_bytes)
+                        chunk = sink.drain()
+                        sent += len(chunk)
+                        yield chunk
+                if failed():
+                    zf.writestr("errors.json", json.dumps(failed(), indent=2))
+            chunk = sink.drain()
+            sent += len(chunk)
+            yield chunk
+            finished = True
+        finally:
+            for t in tasks:
+                t.cancel()
+            if not any(d[1] for d in done.values()):
+                _record(500, sent, "All certificates failed")
+            elif not finished:
+                # Client went away (or the stream broke) before the ZIP was complete
+                _record(500, sent, "ZIP stream not completed")
+            else:
+                _record(200, sent)
+    
+    return StreamingResponse(
+        _stream_zip(), media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.zip"',
+            "X-Certificates-Total": str(len(holders)),
+            "X-Batch-Id": batch_id,
+        }
+    )
+
+
 # ── Dashboard API ──
 
 @app.get("/api/dashboard")
 async def dashboard(x_api_key: str = Header(None)):
     check_auth(x_api_key)
     
-    with get_db() as db:
-        # Overall stats
-        stats = {}
-        for table in ["requests", "extractions", "generations", "errors"]:
-            row = db.execute(f"SELECT COUNT(*) as c FROM {table}").fetchone()
-            stats[f"total_{table}"] = row["c"]
-        
-        # Today's stats
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        for table in ["requests", "extractions", "generations", "errors"]:
-            row = db.execute(f"SELECT COUNT(*) as c FROM {table} WHERE timestamp LIKE ?", (f"{today}%",)).fetchone()
-            stats[f"today_{table}"] = row["c"]
+    # The DB part is cached briefly; pool and cache counters below are live
+    if time.monotonic() - _dashboard_cache["at"] > DASHBOARD_TTL:
+        _dashboard_cache["data"] = await asyncio.to_thread(_dashboard_queries)
+        _dashboard_cache["at"] = time.monotonic()
+    data, cache_entries = _dashboard_cache["data"]
+    
+    lookups = extract_cache_stats["hits"] + extract_cache_stats["misses"]
+    return {
+        **data,
+        "extraction_cache": {
+            **extract_cache_stats,
+            "hit_rate": round(extract_cache_stats["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": cache_entries,
+            "ttl_s": EXTRACT_CACHE_TTL,
+            "version": EXTRACTION_VERSION,
+        },
+        "ai_client": ai_client_info(),
+        "ai_fallback": fallback_stats(),
+        "ai_latency": latency_stats(),
+        "render_pool": get_render_pool().stats(),
+        "ocr_pool": get_ocr_pool().stats(),
+        "telemetry_db": telemetry.stats(),
+        "artifacts": artifacts.stats(),
+    }
+
+
+_dashboard_cache = {"at": float("-inf"), "data": None}
+
+def _dashboard_queries() -> tuple[dict, int]:
+    """Dashboard data from the DB: rollups plus the latest rows (all indexed).
+
+    Returns:
+        (dashboard fields, live extraction-cache entries)
+    """
+    with db_readers.connection() as db:
+        summary = rollup_summary(db)
         
         # Recent requests (last 50)
         recent = [dict(r) for r in db.execute(
@@ -865,84 +1312,59 @@ async def dashboard(x_api_key: str = Header(None)):
             "SELECT id, timestamp, endpoint, error_type, error_message "
             "FROM errors ORDER BY timestamp DESC LIMIT 50").fetchall()]
         
-        # Hourly activity (last 24h)
-        hourly = [dict(r) for r in db.execute("""
-            SELECT strftime('%Y-%m-%d %H:00', timestamp) as hour, COUNT(*) as count
-            FROM requests WHERE timestamp > datetime('now', '-24 hours')
-            GROUP BY hour ORDER BY hour
-        """).fetchall()]
-        
-        # Top error types
-        top_errors = [dict(r) for r in db.execute("""
-            SELECT error_type, COUNT(*) as count, MAX(timestamp) as last_seen
-            FROM errors GROUP BY error_type ORDER BY count DESC LIMIT 10
-        """).fetchall()]
-        
-        # Form type distribution
-        form_dist = [dict(r) for r in db.execute("""
-            SELECT form_type, COUNT(*) as count FROM generations GROUP BY form_type
-        """).fetchall()]
-        
-        # Coverage frequency
-        cov_freq = {}
-        for row in db.execute("SELECT coverages FROM generations").fetchall():
-            for cov in json.loads(row["coverages"] or "[]"):
-                cov_freq[cov] = cov_freq.get(cov, 0) + 1
-        
-        # Average times
-        avg_extract = db.execute("SELECT AVG(ai_duration_ms) as avg FROM extractions WHERE ai_duration_ms > 0").fetchone()
-        avg_gen = db.execute("SELECT AVG(duration_ms) as avg FROM requests WHERE endpoint = '/api/generate' AND status_code = 200").fetchone()
+        cache_entries = db.execute(
+            "SELECT COUNT(*) as c FROM extraction_cache WHERE version = ? AND created_at > ?",
+            (EXTRACTION_VERSION, time.time() - EXTRACT_CACHE_TTL)).fetchone()
         
         # Daily analysis
         latest_analysis = db.execute("SELECT * FROM daily_analysis ORDER BY date DESC LIMIT 1").fetchone()
         
     return {
-        "stats": stats,
+        **summary,
         "recent_requests": recent,
         "recent_generations": recent_gens,
         "recent_extractions": recent_extractions,
         "recent_errors": recent_errors,
-        "hourly_activity": hourly,
-        "top_errors": top_errors,
-        "form_distribution": form_dist,
-        "coverage_frequency": cov_freq,
-        "avg_extraction_ms": round(avg_extract["avg"] or 0, 1),
-        "avg_generation_ms": round(avg_gen["avg"] or 0, 1),
         "latest_analysis": dict(latest_analysis) if latest_analysis else None,
-    }
+    }, cache_entries["c"]
 
 
 @app.get("/api/dashboard/files")
-async def list_files(x_api_key: str = Header(None), folder: str = "generated"):
+async def list_files(x_api_key: str = Header(None), folder: str = "generated",
+                     limit: int = 100, before: Optional[int] = None):
+    """Newest first, `limit` per page; pass `next_before` back as `before` for the next page."""
     check_auth(x_api_key)
-    if folder not in ["uploads", "generated", "extractions", "errors"]:
+    if folder not in ARTIFACT_FOLDERS:
         raise HTTPException(400, "Invalid folder")
     
-    folder_path = os.path.join(DATA_DIR, folder)
-    files = []
-    for f in sorted(os.listdir(folder_path), reverse=True)[:100]:
-        fp = os.path.join(folder_path, f)
-        files.append({"name": f, "size": os.path.getsize(fp), 
-                      "modified": datetime.fromtimestamp(os.path.getmtime(fp)).isoformat()})
-    return {"folder": folder, "files": files}
+    rows, next_before = await asyncio.to_thread(
+        artifacts.list, folder, max(1, min(limit, MAX_FILES_PAGE)), before)
+    files = [{"name": r["name"], "size": r["size"], "stored_size": r["stored_size"],
+              "sha256": r["sha256"], "modified": r["created_at"]} for r in rows]
+    return {"folder": folder, "files": files, "next_before": next_before}
 
 
 @app.get("/api/dashboard/file/{folder}/{filename}")
-async def get_file(folder: str, filename: str, x_api_key: str = Header(None)):
+async def get_file(request: Request, folder: str, filename: str, x_api_key: str = Header(None)):
     check_auth(x_api_key)
-    if folder not in ["uploads", "generated", "extractions", "errors"]:
+    if folder not in ARTIFACT_FOLDERS:
         raise HTTPException(400, "Invalid folder")
     
-    fp = os.path.join(DATA_DIR, folder, filename)
-    if not os.path.exists(fp):
+    art = await asyncio.to_thread(artifacts.get, folder, filename)
+    if art is None or not os.path.isfile(art.path):
         raise HTTPException(404, "File not found")
     
-    with open(fp, "rb") as f:
-        content = f.read()
-    
-    ct = "application/pdf" if filename.endswith(".pdf") else "application/json"
-    return Response(content=content, media_type=ct,
-                   headers={"Content-Disposition": f'inline; filename="{filename}"'})
+    if art.encoding:
+        # Compressed JSON: small, so decompress and send it whole
+        etag = f'"{art.sha256}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        content = await asyncio.to_thread(artifacts.read, art)
+        return Response(content=content, media_type=art.content_type,
+                        headers={**headers, "Content-Disposition": f'inline; filename="{filename}"'})
+    return await file_response(request, art.path, art.content_type, filename,
+                               disposition="inline", content_hash=art.sha256)
 
 
 # ── Auth Routes (append to server.py) ──
@@ -1089,7 +1511,7 @@ async def my_certificates(request: Request):
 async def download_certificate(cert_id: str, request: Request):
     user = require_user(request)
     
-    with get_db() as db:
+    with db_readers.connection() as db:
         cert = db.execute(
             "SELECT * FROM generations WHERE id = ? AND user_id = ?",
             (cert_id, user["id"])
@@ -1102,18 +1524,14 @@ async def download_certificate(cert_id: str, request: Request):
             if not cert:
                 raise HTTPException(404, "Certificate not found")
         
-        path = cert["output_path"]
-        if not path or not os.path.exists(path):
-            raise HTTPException(404, "PDF file not found on disk")
-        
-        with open(path, "rb") as f:
-            pdf_bytes = f.read()
-        
-        filename = f"ACORD-{cert['form_type']}_{cert['insured_name'].replace(' ', '_')}_{cert['timestamp'][:10]}.pdf"
-        return Response(
-            content=pdf_bytes, media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-        )
+    path = cert["output_path"]
+    if not path or not os.path.isfile(path):
+        raise HTTPException(404, "PDF file not found on disk")
+    
+    filename = f"ACORD-{cert['form_type']}_{cert['insured_name'].replace(' ', '_')}_{cert['timestamp'][:10]}.pdf"
+    # Certificates in the artifact store are named by their SHA-256; no need to re-hash
+    return await file_response(request, path, "application/pdf", filename,
+                               content_hash=artifacts.blob_sha256(path))
 
 
 # ── Admin Endpoints ──
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Telemetry DB — Batched background writer and read-only connection pool.
+
+Every telemetry insert used to open a fresh SQLite connection, commit (an
+fsync) and close, on the event loop. Here one long-lived WAL-mode
+connection on a dedicated thread does all the writing: handlers put
+statements on a bounded queue and return immediately, and the thread
+commits whatever has queued up in one transaction. Reads (dashboard,
+downloads, cache lookups) borrow a connection from a small pool of
+read-only connections, which WAL lets run alongside the writer.
+
+Writes become visible to readers a few milliseconds later (after the next
+batch commits); flush() waits for everything queued so far.
+
+Settings (environment):
+    ACORD_DB_QUEUE           queued statements before new ones are dropped (default 10000)
+    ACORD_DB_BATCH           statements per transaction, at most (default 500)
+    ACORD_DB_READERS         read-only connections (default 4)
+
+Usage:
+    from telemetry_db import ReaderPool, TelemetryWriter
+    writer = TelemetryWriter(DB_PATH)
+    writer.write("INSERT INTO requests (...) VALUES (?, ...)", params)
+    readers = ReaderPool(DB_PATH)
+    with readers.connection() as db:
+        db.execute("SELECT COUNT(*) FROM requests").fetchone()
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+DB_QUEUE_SIZE = int(os.getenv("ACORD_DB_QUEUE", "10000"))
+DB_BATCH = int(os.getenv("ACORD_DB_BATCH", "500"))
+DB_READERS = int(os.getenv("ACORD_DB_READERS", "4"))
+
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+(?:OR\s+\w+\s+)?INTO\s+(\w+)", re.IGNORECASE)
+
+
+def enable_wal(db_path: str) -> None:
+    """Switch the database to WAL (persistent, so auth and tools get it too)."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+
+
+class TelemetryWriter:
+    """One writer thread committing queued statements in batches.
+
+    Counts committed inserts per table (`inserted`), which lets the server
+    keep running totals without querying.
+    """
+
+    def __init__(self, db_path: str, max_queue: int = DB_QUEUE_SIZE, batch_size: int = DB_BATCH):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._written = self._batches = self._dropped = self._failed = 0
+        self.inserted: dict[str, int] = {}
+        self.last_commit: Optional[float] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+
+    # ── Caller side ──
+
+    def _put(self, item) -> None:
+        # Called from the event loop: never wait on a full queue
+        if self._closed:
+            raise RuntimeError("telemetry writer is closed")
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._dropped += 1
+            print(f"telemetry: queue full, dropped: {item[0].split('(')[0].strip()}")
+
+    def write(self, sql: str, params: tuple = ()) -> None:
+        """Queue one statement. Returns without waiting for SQLite."""
+        self._put((sql, params, False))
+
+    def write_many(self, sql: str, rows: list) -> None:
+        """Queue an executemany; its rows are committed together."""
+        if rows:
+            self._put((sql, rows, True))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is committed."""
+        done = threading.Event()
+        try:
+            self._queue.put((None, done, False), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(), "written": self._written, "batches": self._batches,
+            "dropped": self._dropped, "failed": self._failed, "alive": self._thread.is_alive(),
+            "last_commit_age_s": (round(time.time() - self.last_commit, 1)
+                                  if self.last_commit is not None else None),
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush and stop the writer thread."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # ── Writer thread ──
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commits don't fsync; a power cut can lose the last
+        # batches but never corrupts the database
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._commit(conn, batch)
+                        return
+                    batch.append(item)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _transaction(conn: sqlite3.Connection, statements: list) -> None:
+        """Run statements in one transaction, rolled back if any fails."""
+        try:
+            conn.execute("BEGIN")
+            for sql, params, many in statements:
+                (conn.executemany if many else conn.execute)(sql, params)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            # BEGIN itself may have failed (e.g. database locked)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _commit(self, conn: sqlite3.Connection, batch: list) -> None:
+        statements = [item for item in batch if item[0] is not None]
+        try:
+            self._transaction(conn, statements)
+            for statement in statements:
+                self._count(statement)
+        except sqlite3.Error:
+            # One bad statement shouldn't lose the rest of the batch
+            for statement in statements:
+                try:
+                    self._transaction(conn, [statement])
+                    self._count(statement)
+                except sqlite3.Error:
+                    self._failed += self._rows(statement)
+                    traceback.print_exc()
+        finally:
+            # Waiters on flush() are released even if the retry gave up
+            self._batches += 1
+            self.last_commit = time.time()
+            for sql, marker, _ in batch:
+                if sql is None:
+                    marker.set()
+
+    @staticmethod
+    def _rows(statement: tuple) -> int:
+        sql, params, many = statement
+        return len(params) if many else 1
+
+    def _count(self, statement: tuple) -> None:
+        rows = self._rows(statement)
+        self._written += rows
+        match = _INSERT_TABLE.match(statement[0])
+        if match:
+            table = match.group(1)
+            self.inserted[table] = self.inserted.get(table, 0) + rows
+
+
+class ReaderPool:
+    """Fixed pool of read-only connections, usable from any thread."""
+
+    def __init__(self, db_path: str, size: int = DB_READERS):
+        self.db_path = db_path
+        self._pool: queue.LifoQueue = queue.LifoQueue()
+        for _ in range(max(1, size)):
+            self._pool.put(None)  # opened on first use
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn: Optional[sqlite3.Connection] = self._pool.get()
+        try:
+            if conn is None:
+                conn = self._open()
+            yield conn
+        except sqlite3.DatabaseError:
+            # Don't hand a broken connection to the next caller
+            if conn is not None:
+                conn.close()
+            conn = None
+            raise
+        finally:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            if conn is not None:
+                conn.close()